@@ -7,6 +7,7 @@ The output goes to frontend/public/data/analytics-v2.json
 
 Usage:
     python export_static_data.py
+    python export_static_data.py --force   # re-export even if the data is unchanged
 """
 
 import json
@@ -14,15 +15,115 @@ import sqlite3
 import hashlib
 import glob
 import os
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import closing
 from datetime import datetime, timedelta
+
+# orjson (C encoder) is optional - fall back to the stdlib json module
+try:
+    import orjson
+except ImportError:
+    orjson = None
 # sync_metrics_to_posts REMOVED - it overwrites fresh API data with stale snapshots
 
 DATABASE_PATH = "data/juanbabes_analytics.db"
 OUTPUT_PATH = "frontend/public/data/analytics-v2.json"
 
 
+# Read-heavy aggregation: map the file and keep a 64MB page cache
+PRAGMAS = """
+    PRAGMA synchronous = NORMAL;
+    PRAGMA temp_store = MEMORY;
+    PRAGMA mmap_size = 268435456;
+    PRAGMA cache_size = -65536;
+"""
+
+
 def get_conn():
-    return sqlite3.connect(DATABASE_PATH)
+    # Per-page queries reuse the same SQL text; keep their prepared
+    # statements cached instead of re-parsing on each page
+    conn = sqlite3.connect(DATABASE_PATH, cached_statements=256)
+    conn.executescript(PRAGMAS)
+    return conn
+
+
+def rows_as_dicts(cursor):
+    """Build one dict per row, keyed by the query's column names/aliases."""
+    # zip() over cursor.description beats sqlite3.Row + dict(row) here,
+    # and keeps the positional rows the other exports rely on
+    keys = [column[0] for column in cursor.description]
+    return [dict(zip(keys, row)) for row in cursor]
+
+
+# Handle both ISO format (2025-09-30T...) and CSV format (10/01/2025 00:01)
+# ISO: first 10 chars = "2025-09-30"
+# CSV: need to rearrange MM/DD/YYYY -> YYYY-MM-DD
+DATE_EXPR = """CASE
+        WHEN publish_time LIKE '____-__-__%' THEN substr(publish_time, 1, 10)
+        ELSE substr(publish_time, 7, 4) || '-' || substr(publish_time, 1, 2) || '-' || substr(publish_time, 4, 2)
+    END"""
+
+# Posts with any engagement.
+# Prefix a query with this and select FROM active instead of posts.
+ACTIVE_CTE = """
+    WITH active AS (
+        SELECT *
+        FROM posts
+        WHERE reactions_total > 0 OR comments_count > 0 OR shares_count > 0
+    )"""
+
+
+def ensure_publish_date(conn):
+    """Add the posts.publish_date column (DATE_EXPR stored at write time).
+
+    Triggers keep it in sync for every script that inserts posts or
+    changes publish_time, so exports can group and index on it directly.
+    """
+    columns = [row[1] for row in conn.execute("PRAGMA table_info(posts)")]
+    if "publish_date" not in columns:
+        conn.execute("ALTER TABLE posts ADD COLUMN publish_date TEXT")
+        conn.execute(f"UPDATE posts SET publish_date = {DATE_EXPR}")
+
+    conn.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS trg_posts_publish_date_insert
+        AFTER INSERT ON posts
+        BEGIN
+            UPDATE posts SET publish_date = {DATE_EXPR} WHERE rowid = NEW.rowid;
+        END
+    """)
+    conn.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS trg_posts_publish_date_update
+        AFTER UPDATE OF publish_time ON posts
+        BEGIN
+            UPDATE posts SET publish_date = {DATE_EXPR} WHERE rowid = NEW.rowid;
+        END
+    """)
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_posts_publish_date ON posts(publish_date)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_posts_page_date ON posts(page_id, publish_date)")
+    conn.commit()
+
+
+# Partial covering indexes over the engaged posts (same predicate as
+# ACTIVE_CTE), holding every column the mv_* refresh aggregates, so the
+# rebuild reads the index alone instead of the table
+ACTIVE_METRICS = "reactions_total, comments_count, shares_count, total_engagement, pes, views_count, reach_count"
+ACTIVE_WHERE = "reactions_total > 0 OR comments_count > 0 OR shares_count > 0"
+
+
+def ensure_covering_indexes(conn):
+    """Create the partial covering indexes used by refresh_materialized_views."""
+    conn.execute(f"""
+        CREATE INDEX IF NOT EXISTS idx_posts_active_metrics
+        ON posts(page_id, publish_date, {ACTIVE_METRICS})
+        WHERE {ACTIVE_WHERE}
+    """)
+    conn.execute(f"""
+        CREATE INDEX IF NOT EXISTS idx_posts_post_type_metrics
+        ON posts(page_id, post_type, {ACTIVE_METRICS})
+        WHERE {ACTIVE_WHERE}
+    """)
+    conn.commit()
 
 
 def normalize_post_type_sql():
@@ -39,400 +140,408 @@ def normalize_post_type_sql():
     END"""
 
 
-def export_stats():
-    """Export dashboard stats (all pages + per-page)."""
-    conn = get_conn()
-    cursor = conn.cursor()
+# Summary tables rebuilt from posts before every export, keyed by page
+# and (optionally) one grouping expression. Rows hold sums plus non-NULL
+# counts so averages can be recombined across pages.
+MATERIALIZED_VIEWS = {
+    # table: (key expression, key column, row filter, source)
+    # source "active" is the engaged posts (ACTIVE_CTE), "posts" is every post
+    "mv_page_stats": (None, None, "", "active"),
+    "mv_post_type_stats": (normalize_post_type_sql(), "post_type", "", "active"),
+    "mv_daily_stats": ("publish_date", "date", "WHERE publish_date IS NOT NULL", "active"),
+    "mv_monthly_stats": ("substr(publish_date, 1, 7)", "month", "WHERE publish_date IS NOT NULL", "active"),
+    "mv_dow_stats": ("CAST(strftime('%w', publish_date) AS INTEGER)", "day_num", "WHERE publish_date IS NOT NULL", "active"),
+    # Page comparison counts every post, engaged or not
+    "mv_page_type_all_stats": (normalize_post_type_sql(), "post_type", "", "posts"),
+}
+
+MV_COLUMNS = """
+    COUNT(*) AS posts,
+    COALESCE(SUM(reactions_total), 0) AS reactions,
+    COALESCE(SUM(comments_count), 0) AS comments,
+    COALESCE(SUM(shares_count), 0) AS shares,
+    COALESCE(SUM(total_engagement), 0) AS engagement,
+    COUNT(total_engagement) AS engagement_n,
+    COALESCE(SUM(pes), 0) AS pes,
+    COUNT(pes) AS pes_n,
+    COALESCE(SUM(views_count), 0) AS views,
+    COUNT(views_count) AS views_n,
+    COALESCE(SUM(reach_count), 0) AS reach
+"""
 
-    # Get all pages first
-    cursor.execute("SELECT DISTINCT page_id FROM posts WHERE reactions_total > 0")
-    page_ids = [row[0] for row in cursor.fetchall()]
 
-    # Aggregate stats
-    cursor.execute("""
-        SELECT
-            COALESCE(SUM(reactions_total), 0) as total_reactions,
-            COALESCE(SUM(comments_count), 0) as total_comments,
-            COALESCE(SUM(shares_count), 0) as total_shares,
-            COALESCE(SUM(total_engagement), 0) as total_engagement,
-            COALESCE(SUM(pes), 0) as total_pes,
-            COUNT(*) as total_posts,
-            COALESCE(SUM(views_count), 0) as total_views,
-            COALESCE(SUM(reach_count), 0) as total_reach
-        FROM posts
-        WHERE reactions_total > 0 OR comments_count > 0 OR shares_count > 0
-    """)
-    row = cursor.fetchone()
+def mv_avg(column, digits=None):
+    """SQL for the average of a summed mv_* column (0 when there are no values).
+
+    Pass digits to have SQLite round the result.
+    """
+    avg = f"SUM({column}) * 1.0 / NULLIF(SUM({column}_n), 0)"
+    if digits is not None:
+        avg = f"ROUND({avg}, {digits})"
+    return f"COALESCE({avg}, 0)"
+
+
+def per_post_avg(total, posts="posts"):
+    """SQL for SUM(total) / SUM(posts), rounded to 1dp (0 when there are no posts)."""
+    return f"COALESCE(ROUND(SUM({total}) * 1.0 / NULLIF(SUM({posts}), 0), 1), 0)"
+
+
+def refresh_materialized_views(conn):
+    """Rebuild the mv_* summary tables from the posts table."""
+    for table, (key_expr, key_column, where, source) in MATERIALIZED_VIEWS.items():
+        key_select = f"{key_expr} AS {key_column}," if key_expr else ""
+        # Group by the expression itself: an alias such as post_type would
+        # resolve to the raw posts column instead
+        group_by = f"page_id, {key_expr}" if key_expr else "page_id"
+        conn.execute(f"DROP TABLE IF EXISTS {table}")
+        conn.execute(f"""
+            CREATE TABLE {table} AS
+            {ACTIVE_CTE if source == "active" else ""}
+            SELECT page_id, {key_select} {MV_COLUMNS}
+            FROM {source}
+            {where}
+            GROUP BY {group_by}
+        """)
+    conn.execute("CREATE INDEX idx_mv_daily_stats_page_date ON mv_daily_stats(page_id, date)")
+    conn.commit()
+
+
+# Bump whenever the export code or the JSON layout changes, so the next run
+# rebuilds analytics-v2.json even if the data is the same.
+EXPORT_VERSION = 2
+
+# Every table the export reads that a fetch/import/update script can change.
+# Today's date is part of the fingerprint too: the weekly windows move daily.
+FINGERPRINT_TABLES = ("posts", "pages", "livestream_daily", "livestream_schedule", "livestream_promo")
+
+
+def data_fingerprint(conn):
+    """Hash of EXPORT_VERSION, today's date and, per source table, its schema
+    plus one aggregate row: COUNT(*), MAX(rowid), the SUM of every numeric
+    column, the total length of every text column and the MAX of every
+    *_at timestamp.
+
+    Each aggregate is a single scan done inside SQLite, so no rows are
+    copied into Python. The sums still move when an UPDATE edits fan
+    counts, metrics or titles in place.
+    """
+    digest = hashlib.sha1(f"{EXPORT_VERSION}|{datetime.now().date().isoformat()}".encode())
+    schemas = dict(conn.execute("SELECT name, sql FROM sqlite_master WHERE type='table'"))
+    for table in FINGERPRINT_TABLES:
+        if table not in schemas:
+            continue
+        aggregates = ["COUNT(*)", "MAX(rowid)"]
+        for _, name, col_type, *_ in conn.execute(f"PRAGMA table_info({table})"):
+            col_type = (col_type or "").upper()
+            if name.endswith("_at"):
+                aggregates.append(f'MAX("{name}")')
+            elif any(kind in col_type for kind in ("INT", "REAL", "FLOA", "DOUB", "NUM")):
+                aggregates.append(f'TOTAL("{name}")')
+            else:
+                aggregates.append(f'TOTAL(length("{name}"))')
+        row = conn.execute(f"SELECT {', '.join(aggregates)} FROM {table}").fetchone()
+        digest.update(f"{table}|{schemas[table]}|{row!r}".encode())
+    return digest.hexdigest()
 
-    cursor.execute("""
-        SELECT MIN(publish_time), MAX(publish_time)
-        FROM posts WHERE publish_time IS NOT NULL
-    """)
-    dates = cursor.fetchone()
 
-    cursor.execute("SELECT COUNT(DISTINCT page_id) FROM posts WHERE reactions_total > 0")
-    active_pages = cursor.fetchone()[0]
+def get_meta(conn, key):
+    conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+    row = conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+    return row[0] if row else None
 
-    cursor.execute("SELECT COUNT(*) FROM pages")
-    total_pages_count = cursor.fetchone()[0]
 
-    post_count = row[5]
-    total_engagement = row[3]
-    total_pes = row[4]
-    total_views = row[6]
-    total_reach = row[7]
+def set_meta(conn, key, value):
+    conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+    conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (key, value))
+    conn.commit()
+
 
-    all_stats = {
-        "total_posts": post_count,
-        "total_pages": active_pages,
-        "all_pages": total_pages_count,
+def _stats_from_row(row, total_pages, all_pages):
+    """Build a stats dict from a row of STATS_COLUMNS."""
+    return {
+        "total_posts": row[5],
+        "total_pages": total_pages,
+        "all_pages": all_pages,
         "total_reactions": row[0],
         "total_comments": row[1],
         "total_shares": row[2],
-        "total_engagement": total_engagement,
-        "total_pes": round(total_pes, 1),
-        "total_views": total_views,
-        "total_reach": total_reach,
-        "avg_engagement": round(total_engagement / post_count, 1) if post_count > 0 else 0,
-        "avg_pes": round(total_pes / post_count, 1) if post_count > 0 else 0,
-        "avg_views": round(total_views / post_count, 1) if post_count > 0 else 0,
-        "avg_reach": round(total_reach / post_count, 1) if post_count > 0 else 0,
-        "date_range_start": str(dates[0])[:10] if dates[0] else None,
-        "date_range_end": str(dates[1])[:10] if dates[1] else None,
+        "total_engagement": row[3],
+        "total_pes": row[4],
+        "total_views": row[6],
+        "total_reach": row[7],
+        "avg_engagement": row[10],
+        "avg_pes": row[11],
+        "avg_views": row[12],
+        "avg_reach": row[13],
+        "date_range_start": row[8],
+        "date_range_end": row[9],
     }
 
-    # Per-page stats
-    by_page = {}
-    for page_id in page_ids:
-        cursor.execute("""
-            SELECT
-                COALESCE(SUM(reactions_total), 0) as total_reactions,
-                COALESCE(SUM(comments_count), 0) as total_comments,
-                COALESCE(SUM(shares_count), 0) as total_shares,
-                COALESCE(SUM(total_engagement), 0) as total_engagement,
-                COALESCE(SUM(pes), 0) as total_pes,
-                COUNT(*) as total_posts,
-                COALESCE(SUM(views_count), 0) as total_views,
-                COALESCE(SUM(reach_count), 0) as total_reach
-            FROM posts
-            WHERE page_id = ? AND (reactions_total > 0 OR comments_count > 0 OR shares_count > 0)
-        """, (page_id,))
-        prow = cursor.fetchone()
-
-        cursor.execute("""
-            SELECT MIN(publish_time), MAX(publish_time)
-            FROM posts WHERE page_id = ? AND publish_time IS NOT NULL
-        """, (page_id,))
-        pdates = cursor.fetchone()
-
-        ppost_count = prow[5]
-        ptotal_engagement = prow[3]
-        ptotal_pes = prow[4]
-        ptotal_views = prow[6]
-        ptotal_reach = prow[7]
-
-        by_page[page_id] = {
-            "total_posts": ppost_count,
-            "total_pages": 1,
-            "all_pages": 1,
-            "total_reactions": prow[0],
-            "total_comments": prow[1],
-            "total_shares": prow[2],
-            "total_engagement": ptotal_engagement,
-            "total_pes": round(ptotal_pes, 1),
-            "total_views": ptotal_views,
-            "total_reach": ptotal_reach,
-            "avg_engagement": round(ptotal_engagement / ppost_count, 1) if ppost_count > 0 else 0,
-            "avg_pes": round(ptotal_pes / ppost_count, 1) if ppost_count > 0 else 0,
-            "avg_views": round(ptotal_views / ppost_count, 1) if ppost_count > 0 else 0,
-            "avg_reach": round(ptotal_reach / ppost_count, 1) if ppost_count > 0 else 0,
-            "date_range_start": str(pdates[0])[:10] if pdates[0] else None,
-            "date_range_end": str(pdates[1])[:10] if pdates[1] else None,
-        }
 
-    conn.close()
+# Sums only count posts with engagement; the date range covers every post.
+# Averages are per engaged post, rounded by SQLite.
+STATS_COLUMNS = """
+    COALESCE(SUM(CASE WHEN {active} THEN reactions_total END), 0) as total_reactions,
+    COALESCE(SUM(CASE WHEN {active} THEN comments_count END), 0) as total_comments,
+    COALESCE(SUM(CASE WHEN {active} THEN shares_count END), 0) as total_shares,
+    COALESCE(SUM(CASE WHEN {active} THEN total_engagement END), 0) as total_engagement,
+    ROUND(COALESCE(SUM(CASE WHEN {active} THEN pes END), 0), 1) as total_pes,
+    COUNT(CASE WHEN {active} THEN 1 END) as total_posts,
+    COALESCE(SUM(CASE WHEN {active} THEN views_count END), 0) as total_views,
+    COALESCE(SUM(CASE WHEN {active} THEN reach_count END), 0) as total_reach,
+    MIN(publish_date),
+    MAX(publish_date),
+    COALESCE(ROUND(SUM(CASE WHEN {active} THEN total_engagement END) * 1.0
+                   / NULLIF(COUNT(CASE WHEN {active} THEN 1 END), 0), 1), 0) as avg_engagement,
+    COALESCE(ROUND(SUM(CASE WHEN {active} THEN pes END) * 1.0
+                   / NULLIF(COUNT(CASE WHEN {active} THEN 1 END), 0), 1), 0) as avg_pes,
+    COALESCE(ROUND(SUM(CASE WHEN {active} THEN views_count END) * 1.0
+                   / NULLIF(COUNT(CASE WHEN {active} THEN 1 END), 0), 1), 0) as avg_views,
+    COALESCE(ROUND(SUM(CASE WHEN {active} THEN reach_count END) * 1.0
+                   / NULLIF(COUNT(CASE WHEN {active} THEN 1 END), 0), 1), 0) as avg_reach
+""".format(active="(reactions_total > 0 OR comments_count > 0 OR shares_count > 0)")
+
+
+def export_stats(conn):
+    """Export dashboard stats (all pages + per-page)."""
+    cursor = conn.cursor()
+    cursor.arraysize = 1000
+
+    # Aggregate stats
+    cursor.execute(f"SELECT {STATS_COLUMNS} FROM posts")
+    row = cursor.fetchone()
+
+    cursor.execute("SELECT COUNT(*) FROM pages")
+    total_pages_count = cursor.fetchone()[0]
+
+    # Per-page stats in one pass (only pages with at least one reacted post)
+    cursor.execute(f"""
+        SELECT page_id, {STATS_COLUMNS}
+        FROM posts
+        GROUP BY page_id
+        HAVING MAX(reactions_total > 0) = 1
+    """)
+    by_page = {prow[0]: _stats_from_row(prow[1:], 1, 1) for prow in cursor}
+
+    all_stats = _stats_from_row(row, len(by_page), total_pages_count)
     return {"all": all_stats, "byPage": by_page}
 
 
-def export_pages():
-    """Export page comparison data."""
-    conn = get_conn()
-    cursor = conn.cursor()
+def page_stats(conn):
+    """Per-page totals from mv_page_stats as row tuples, highest engagement first.
 
-    cursor.execute("""
+    Queried once per export: export_pages and the pageRankings in
+    export_time_series are both built from these rows.
+    """
+    cursor = conn.execute(f"""
         SELECT
             pg.page_id,
             pg.page_name,
             pg.fan_count,
             pg.followers_count,
-            COUNT(p.post_id) as post_count,
-            COALESCE(SUM(p.reactions_total), 0) as total_reactions,
-            COALESCE(SUM(p.comments_count), 0) as total_comments,
-            COALESCE(SUM(p.shares_count), 0) as total_shares,
-            COALESCE(SUM(p.total_engagement), 0) as total_engagement,
-            COALESCE(AVG(p.pes), 0) as avg_pes,
-            COALESCE(SUM(p.views_count), 0) as total_views,
-            COALESCE(SUM(p.reach_count), 0) as total_reach
+            m.posts as post_count,
+            m.reactions as total_reactions,
+            m.comments as total_comments,
+            m.shares as total_shares,
+            m.engagement as total_engagement,
+            {mv_avg('m.pes', 1)} as avg_pes,
+            m.views as total_views,
+            m.reach as total_reach,
+            {per_post_avg('m.engagement', 'm.posts')} as avg_engagement_per_post,
+            {mv_avg('m.engagement', 1)} as avg_engagement
         FROM pages pg
-        LEFT JOIN posts p ON pg.page_id = p.page_id
-            AND (p.reactions_total > 0 OR p.comments_count > 0 OR p.shares_count > 0)
+        JOIN mv_page_stats m ON pg.page_id = m.page_id
         GROUP BY pg.page_id
-        HAVING COUNT(p.post_id) > 0
         ORDER BY total_engagement DESC
     """)
-
-    result = []
-    for row in cursor.fetchall():
-        post_count = row[4]
-        total_engagement = row[8]
-        result.append({
-            "page_id": row[0],
-            "name": row[1],  # For frontend compatibility
-            "page_name": row[1],
-            "fan_count": row[2],
-            "followers_count": row[3],
-            "post_count": post_count,
-            "total_reactions": row[5],
-            "total_comments": row[6],
-            "total_shares": row[7],
-            "total_engagement": total_engagement,
-            "avg_engagement": round(total_engagement / post_count, 1) if post_count > 0 else 0,
-            "avg_pes": round(row[9], 1),
-            "total_views": row[10],
-            "total_reach": row[11]
-        })
-
-    conn.close()
-    return result
-
-
-def export_post_types():
+    return cursor.fetchall()
+
+
+def export_pages(page_rows):
+    """Export page comparison data (from page_stats rows)."""
+    return [{
+        "page_id": row[0],
+        "name": row[1],  # For frontend compatibility
+        "page_name": row[1],
+        "fan_count": row[2],
+        "followers_count": row[3],
+        "post_count": row[4],
+        "total_reactions": row[5],
+        "total_comments": row[6],
+        "total_shares": row[7],
+        "total_engagement": row[8],
+        "avg_engagement": row[12],
+        "avg_pes": row[9],
+        "total_views": row[10],
+        "total_reach": row[11]
+    } for row in page_rows]
+
+
+def export_post_types(conn):
     """Export post type statistics (all pages + per-page)."""
-    conn = get_conn()
     cursor = conn.cursor()
+    cursor.arraysize = 1000
 
-    # Get all pages first
-    cursor.execute("SELECT DISTINCT page_id FROM posts WHERE reactions_total > 0")
-    page_ids = [row[0] for row in cursor.fetchall()]
-
-    # Normalize post types (combine IMAGE/Photos, VIDEO/Videos, etc.)
-    type_expr = normalize_post_type_sql()
-
-    # Aggregate post types
+    # Aggregate post types (normalized in mv_post_type_stats)
     cursor.execute(f"""
         SELECT
-            {type_expr} as post_type,
-            COUNT(*) as count,
-            COALESCE(SUM(reactions_total), 0) as reactions,
-            COALESCE(SUM(comments_count), 0) as comments,
-            COALESCE(SUM(shares_count), 0) as shares,
-            COALESCE(SUM(total_engagement), 0) as total_engagement,
-            COALESCE(AVG(pes), 0) as avg_pes
-        FROM posts
-        WHERE reactions_total > 0 OR comments_count > 0 OR shares_count > 0
-        GROUP BY {type_expr}
+            post_type,
+            SUM(posts) as count,
+            SUM(reactions) as reactions,
+            SUM(comments) as comments,
+            SUM(shares) as shares,
+            SUM(engagement) as total_engagement,
+            {mv_avg('pes', 1)} as avg_pes,
+            {per_post_avg('engagement')} as avg_engagement
+        FROM mv_post_type_stats
+        GROUP BY post_type
         ORDER BY count DESC
     """)
 
     all_types = []
-    for row in cursor.fetchall():
-        count = row[1]
-        total_engagement = row[5]
+    for row in cursor:
         all_types.append({
             "post_type": row[0],
-            "count": count,
+            "count": row[1],
             "reactions": row[2],
             "comments": row[3],
             "shares": row[4],
-            "total_engagement": total_engagement,
-            "avg_engagement": round(total_engagement / count, 1) if count > 0 else 0,
-            "avg_pes": round(row[6], 1)
+            "total_engagement": row[5],
+            "avg_engagement": row[7],
+            "avg_pes": row[6]
         })
 
-    # Per-page post types
+    # Per-page post types, all pages in one query
+    cursor.execute(f"""
+        SELECT
+            page_id,
+            post_type,
+            posts as count,
+            reactions,
+            comments,
+            shares,
+            engagement as total_engagement,
+            {mv_avg('pes', 1)} as avg_pes,
+            {per_post_avg('engagement')} as avg_engagement
+        FROM mv_post_type_stats
+        GROUP BY page_id, post_type
+        ORDER BY page_id, count DESC
+    """)
+
     by_page = {}
-    for page_id in page_ids:
-        cursor.execute(f"""
-            SELECT
-                {type_expr} as post_type,
-                COUNT(*) as count,
-                COALESCE(SUM(reactions_total), 0) as reactions,
-                COALESCE(SUM(comments_count), 0) as comments,
-                COALESCE(SUM(shares_count), 0) as shares,
-                COALESCE(SUM(total_engagement), 0) as total_engagement,
-                COALESCE(AVG(pes), 0) as avg_pes
-            FROM posts
-            WHERE page_id = ? AND (reactions_total > 0 OR comments_count > 0 OR shares_count > 0)
-            GROUP BY {type_expr}
-            ORDER BY count DESC
-        """, (page_id,))
-
-        page_types = []
-        for row in cursor.fetchall():
-            count = row[1]
-            total_engagement = row[5]
-            page_types.append({
-                "post_type": row[0],
-                "count": count,
-                "reactions": row[2],
-                "comments": row[3],
-                "shares": row[4],
-                "total_engagement": total_engagement,
-                "avg_engagement": round(total_engagement / count, 1) if count > 0 else 0,
-                "avg_pes": round(row[6], 1)
-            })
-        by_page[page_id] = page_types
+    for row in cursor:
+        by_page.setdefault(row[0], []).append({
+            "post_type": row[1],
+            "count": row[2],
+            "reactions": row[3],
+            "comments": row[4],
+            "shares": row[5],
+            "total_engagement": row[6],
+            "avg_engagement": row[8],
+            "avg_pes": row[7]
+        })
 
-    conn.close()
     return {"all": all_types, "byPage": by_page}
 
 
-def export_daily():
-    """Export daily engagement data (all pages + per-page)."""
-    conn = get_conn()
-    cursor = conn.cursor()
+DAILY_KEYS = ("date", "posts", "reactions", "comments", "shares", "engagement", "pes", "views", "reach")
 
-    # Get all pages first
-    cursor.execute("SELECT DISTINCT page_id FROM posts WHERE reactions_total > 0")
-    page_ids = [row[0] for row in cursor.fetchall()]
 
-    # Handle both ISO format (2025-09-30T...) and CSV format (10/01/2025 00:01)
-    # ISO: first 10 chars = "2025-09-30"
-    # CSV: need to rearrange MM/DD/YYYY -> YYYY-MM-DD
-    date_expr = """CASE
-        WHEN publish_time LIKE '____-__-__%' THEN substr(publish_time, 1, 10)
-        ELSE substr(publish_time, 7, 4) || '-' || substr(publish_time, 1, 2) || '-' || substr(publish_time, 4, 2)
-    END"""
+def export_daily(conn):
+    """Export daily engagement data (all pages + per-page)."""
+    cursor = conn.cursor()
+    cursor.arraysize = 1000
 
-    # Aggregate daily data
-    cursor.execute(f"""
+    # Aggregate daily data - columns come back in DAILY_KEYS order, already
+    # rounded, so each row zips straight into its dict
+    cursor.execute("""
         SELECT
-            {date_expr} as post_date,
-            COUNT(*) as post_count,
-            COALESCE(SUM(reactions_total), 0) as reactions,
-            COALESCE(SUM(comments_count), 0) as comments,
-            COALESCE(SUM(shares_count), 0) as shares,
-            COALESCE(SUM(total_engagement), 0) as engagement,
-            COALESCE(SUM(pes), 0) as pes,
-            COALESCE(SUM(views_count), 0) as views,
-            COALESCE(SUM(reach_count), 0) as reach
-        FROM posts
-        WHERE publish_time IS NOT NULL
-            AND (reactions_total > 0 OR comments_count > 0 OR shares_count > 0)
-        GROUP BY {date_expr}
+            date as post_date,
+            SUM(posts) as post_count,
+            SUM(reactions) as reactions,
+            SUM(comments) as comments,
+            SUM(shares) as shares,
+            SUM(engagement) as engagement,
+            ROUND(SUM(pes), 1) as pes,
+            SUM(views) as views,
+            SUM(reach) as reach
+        FROM mv_daily_stats
+        GROUP BY date
         ORDER BY post_date
     """)
+    all_daily = [dict(zip(DAILY_KEYS, row)) for row in cursor]
 
-    all_daily = []
-    for row in cursor.fetchall():
-        all_daily.append({
-            "date": row[0],
-            "posts": row[1],
-            "reactions": row[2],
-            "comments": row[3],
-            "shares": row[4],
-            "engagement": row[5],
-            "pes": round(row[6], 1),
-            "views": row[7],
-            "reach": row[8]
-        })
-
-    # Per-page daily data
+    # Per-page daily data, all pages in one query
+    cursor.execute("""
+        SELECT
+            page_id,
+            date as post_date,
+            posts as post_count,
+            reactions,
+            comments,
+            shares,
+            engagement,
+            ROUND(pes, 1) as pes,
+            views,
+            reach
+        FROM mv_daily_stats
+        ORDER BY page_id, post_date
+    """)
     by_page = {}
-    for page_id in page_ids:
-        cursor.execute(f"""
-            SELECT
-                {date_expr} as post_date,
-                COUNT(*) as post_count,
-                COALESCE(SUM(reactions_total), 0) as reactions,
-                COALESCE(SUM(comments_count), 0) as comments,
-                COALESCE(SUM(shares_count), 0) as shares,
-                COALESCE(SUM(total_engagement), 0) as engagement,
-                COALESCE(SUM(pes), 0) as pes,
-                COALESCE(SUM(views_count), 0) as views,
-                COALESCE(SUM(reach_count), 0) as reach
-            FROM posts
-            WHERE page_id = ? AND publish_time IS NOT NULL
-                AND (reactions_total > 0 OR comments_count > 0 OR shares_count > 0)
-            GROUP BY {date_expr}
-            ORDER BY post_date
-        """, (page_id,))
-
-        page_daily = []
-        for row in cursor.fetchall():
-            page_daily.append({
-                "date": row[0],
-                "posts": row[1],
-                "reactions": row[2],
-                "comments": row[3],
-                "shares": row[4],
-                "engagement": row[5],
-                "pes": round(row[6], 1),
-                "views": row[7],
-                "reach": row[8]
-            })
-        by_page[page_id] = page_daily
+    for row in cursor:
+        by_page.setdefault(row[0], []).append(dict(zip(DAILY_KEYS, row[1:])))
 
-    conn.close()
     return {"all": all_daily, "byPage": by_page}
 
 
-def export_time_series():
-    """Export time series data: monthly, weekly, and day-of-week analytics."""
-    conn = get_conn()
-    cursor = conn.cursor()
+# strftime('%w') day numbers: 0 = Sunday
+DOW_NAMES = ("Sun", "Mon", "Tue", "Wed", "Thu", "Fri", "Sat")
 
-    # Handle both ISO format (2025-09-30T...) and CSV format (10/01/2025 00:01)
-    date_expr = """CASE
-        WHEN publish_time LIKE '____-__-__%' THEN substr(publish_time, 1, 10)
-        ELSE substr(publish_time, 7, 4) || '-' || substr(publish_time, 1, 2) || '-' || substr(publish_time, 4, 2)
-    END"""
-    month_expr = """CASE
-        WHEN publish_time LIKE '____-__-__%' THEN substr(publish_time, 1, 7)
-        ELSE substr(publish_time, 7, 4) || '-' || substr(publish_time, 1, 2)
-    END"""
 
-    # Monthly data
+def export_time_series(conn, page_rows):
+    """Export time series data: monthly, weekly, and day-of-week analytics.
+
+    page_rows are the page_stats rows, used for the page rankings.
+    """
+    cursor = conn.cursor()
+    cursor.arraysize = 1000
+
+    # Monthly data (last 6 months, oldest first); LAG gives the previous
+    # month's engagement for the MoM change
     cursor.execute(f"""
-        SELECT
-            {month_expr} as month,
-            COUNT(*) as post_count,
-            COALESCE(SUM(reactions_total), 0) as reactions,
-            COALESCE(SUM(comments_count), 0) as comments,
-            COALESCE(SUM(shares_count), 0) as shares,
-            COALESCE(SUM(views_count), 0) as views,
-            COALESCE(SUM(reach_count), 0) as reach,
-            COALESCE(SUM(total_engagement), 0) as engagement,
-            COALESCE(AVG(total_engagement), 0) as avg_engagement
-        FROM posts
-        WHERE publish_time IS NOT NULL
-            AND (reactions_total > 0 OR comments_count > 0 OR shares_count > 0)
-        GROUP BY {month_expr}
-        ORDER BY month DESC
-        LIMIT 6
+        WITH m AS (
+            SELECT
+                month,
+                SUM(posts) as post_count,
+                SUM(reactions) as reactions,
+                SUM(comments) as comments,
+                SUM(shares) as shares,
+                SUM(views) as views,
+                SUM(reach) as reach,
+                SUM(engagement) as engagement,
+                {mv_avg('engagement', 1)} as avg_engagement
+            FROM mv_monthly_stats
+            GROUP BY month
+            ORDER BY month DESC
+            LIMIT 6
+        )
+        SELECT *, LAG(engagement) OVER (ORDER BY month) as prev_engagement
+        FROM m
+        ORDER BY month
     """)
 
-    monthly = []
-    prev_engagement = None
-    rows = list(cursor.fetchall())
-    for row in reversed(rows):  # Oldest first for MoM calculation
-        engagement = row[7]
-        mom_change = None
-        if prev_engagement and prev_engagement > 0:
-            mom_change = round(((engagement - prev_engagement) / prev_engagement) * 100, 1)
-        monthly.append({
-            "month": row[0],
-            "posts": row[1],
-            "reactions": row[2],
-            "comments": row[3],
-            "shares": row[4],
-            "views": row[5],
-            "reach": row[6],
-            "engagement": engagement,
-            "avg_engagement": round(row[8], 1),
-            "mom_change": mom_change
-        })
-        prev_engagement = engagement
+    monthly = [{
+        "month": row[0],
+        "posts": row[1],
+        "reactions": row[2],
+        "comments": row[3],
+        "shares": row[4],
+        "views": row[5],
+        "reach": row[6],
+        "engagement": row[7],
+        "avg_engagement": row[8],
+        "mom_change": round(((row[7] - row[9]) / row[9]) * 100, 1) if row[9] else None
+    } for row in cursor]
 
     # Weekly data (last 4 weeks) - proper 7-day periods
     # Calculate 4 complete weeks going backwards from yesterday (today may have incomplete data)
@@ -440,204 +549,144 @@ def export_time_series():
     # Start from yesterday to ensure we have complete data
     end_date = today - timedelta(days=1)
 
-    weekly = []
-    prev_weekly_engagement = None
-
-    for week_num in range(4):
-        # Calculate week boundaries (7 days each)
-        week_end = end_date - timedelta(days=week_num * 7)
-        week_start = week_end - timedelta(days=6)
-
-        week_start_str = week_start.strftime('%Y-%m-%d')
-        week_end_str = week_end.strftime('%Y-%m-%d')
-
-        cursor.execute(f"""
+    # Week 0 is the most recent; LAG over week_num DESC gives the week before
+    cursor.execute(f"""
+        WITH weeks AS (
             SELECT
-                COUNT(*) as post_count,
-                COALESCE(SUM(reactions_total), 0) as reactions,
-                COALESCE(SUM(comments_count), 0) as comments,
-                COALESCE(SUM(shares_count), 0) as shares,
-                COALESCE(SUM(views_count), 0) as views,
-                COALESCE(SUM(reach_count), 0) as reach,
-                COALESCE(SUM(total_engagement), 0) as engagement,
-                COALESCE(AVG(total_engagement), 0) as avg_engagement
-            FROM posts
-            WHERE publish_time IS NOT NULL
-                AND {date_expr} >= ?
-                AND {date_expr} <= ?
-                AND (reactions_total > 0 OR comments_count > 0 OR shares_count > 0)
-        """, (week_start_str, week_end_str))
-
-        row = cursor.fetchone()
-        engagement = row[6]
-
-        weekly.append({
-            "week": f"Week {4 - week_num}",
-            "week_start": week_start_str,
-            "week_end": week_end_str,
-            "posts": row[0],
-            "reactions": row[1],
-            "comments": row[2],
-            "shares": row[3],
-            "views": row[4],
-            "reach": row[5],
-            "engagement": engagement,
-            "avg_engagement": round(row[7], 1),
-            "wow_change": None  # Will be calculated after
-        })
-
-    # Reverse so oldest is first, then calculate WoW changes
-    weekly = list(reversed(weekly))
-
-    # Calculate WoW changes (week-over-week)
-    for i, week in enumerate(weekly):
-        if i > 0 and weekly[i-1]['engagement'] > 0:
-            prev_eng = weekly[i-1]['engagement']
-            curr_eng = week['engagement']
-            week['wow_change'] = round(((curr_eng - prev_eng) / prev_eng) * 100, 1)
-
-    # Reverse back so most recent is first
-    weekly = list(reversed(weekly))
+                n as week_num,
+                date(:end_date, printf('-%d days', n * 7 + 6)) as week_start,
+                date(:end_date, printf('-%d days', n * 7)) as week_end
+            FROM (SELECT 0 as n UNION ALL SELECT 1 UNION ALL SELECT 2 UNION ALL SELECT 3)
+        ),
+        w AS (
+            SELECT
+                wk.week_num,
+                wk.week_start,
+                wk.week_end,
+                COALESCE(SUM(d.posts), 0) as post_count,
+                COALESCE(SUM(d.reactions), 0) as reactions,
+                COALESCE(SUM(d.comments), 0) as comments,
+                COALESCE(SUM(d.shares), 0) as shares,
+                COALESCE(SUM(d.views), 0) as views,
+                COALESCE(SUM(d.reach), 0) as reach,
+                COALESCE(SUM(d.engagement), 0) as engagement,
+                {mv_avg('d.engagement', 1)} as avg_engagement
+            FROM weeks wk
+            LEFT JOIN mv_daily_stats d ON d.date >= wk.week_start AND d.date <= wk.week_end
+            GROUP BY wk.week_num
+        )
+        SELECT *, LAG(engagement) OVER (ORDER BY week_num DESC) as prev_engagement
+        FROM w
+        ORDER BY week_num
+    """, {"end_date": end_date.strftime('%Y-%m-%d')})
+
+    weekly = [{
+        "week": f"Week {4 - row[0]}",
+        "week_start": row[1],
+        "week_end": row[2],
+        "posts": row[3],
+        "reactions": row[4],
+        "comments": row[5],
+        "shares": row[6],
+        "views": row[7],
+        "reach": row[8],
+        "engagement": row[9],
+        "avg_engagement": row[10],
+        "wow_change": round(((row[9] - row[11]) / row[11]) * 100, 1) if row[11] else None
+    } for row in cursor]
 
     # Day of week analysis
-    dow_expr = f"CAST(strftime('%w', {date_expr}) AS INTEGER)"
     cursor.execute(f"""
         SELECT
-            CASE {dow_expr}
-                WHEN 0 THEN 'Sun'
-                WHEN 1 THEN 'Mon'
-                WHEN 2 THEN 'Tue'
-                WHEN 3 THEN 'Wed'
-                WHEN 4 THEN 'Thu'
-                WHEN 5 THEN 'Fri'
-                WHEN 6 THEN 'Sat'
-            END as day_name,
-            {dow_expr} as day_num,
-            COUNT(*) as post_count,
-            COALESCE(SUM(total_engagement), 0) as total_engagement,
-            COALESCE(AVG(total_engagement), 0) as avg_engagement,
-            COALESCE(SUM(views_count), 0) as views,
-            COALESCE(SUM(reach_count), 0) as reach
-        FROM posts
-        WHERE publish_time IS NOT NULL
-            AND (reactions_total > 0 OR comments_count > 0 OR shares_count > 0)
+            day_num,
+            SUM(posts) as post_count,
+            SUM(engagement) as total_engagement,
+            {mv_avg('engagement', 1)} as avg_engagement,
+            SUM(views) as views,
+            SUM(reach) as reach,
+            {mv_avg('engagement')} = MAX({mv_avg('engagement')}) OVER () as is_best
+        FROM mv_dow_stats
+        WHERE day_num IS NOT NULL  -- publish_date that strftime cannot parse
         GROUP BY day_num
         ORDER BY day_num
     """)
 
-    day_of_week = []
-    max_avg = 0
-    rows = list(cursor.fetchall())
-    for row in rows:
-        avg_eng = row[4]
-        if avg_eng > max_avg:
-            max_avg = avg_eng
-
-    for row in rows:
-        avg_eng = row[4]
-        day_of_week.append({
-            "day": row[0],
-            "day_num": row[1],
-            "posts": row[2],
-            "total_engagement": row[3],
-            "avg_engagement": round(avg_eng, 1),
-            "views": row[5],
-            "reach": row[6],
-            "is_best": avg_eng == max_avg
-        })
-
-    # Page rankings (sorted by engagement)
-    cursor.execute("""
-        SELECT
-            pg.page_id,
-            pg.page_name,
-            COUNT(p.post_id) as post_count,
-            COALESCE(SUM(p.views_count), 0) as views,
-            COALESCE(SUM(p.reach_count), 0) as reach,
-            COALESCE(SUM(p.total_engagement), 0) as engagement,
-            COALESCE(AVG(p.total_engagement), 0) as avg_engagement
-        FROM pages pg
-        LEFT JOIN posts p ON pg.page_id = p.page_id
-            AND (p.reactions_total > 0 OR p.comments_count > 0 OR p.shares_count > 0)
-        GROUP BY pg.page_id
-        HAVING COUNT(p.post_id) > 0
-        ORDER BY engagement DESC
-    """)
-
-    page_rankings = []
-    for i, row in enumerate(cursor.fetchall()):
-        page_rankings.append({
-            "rank": i + 1,
-            "page_id": row[0],
-            "name": row[1],  # For frontend compatibility
-            "page_name": row[1],
-            "posts": row[2],
-            "views": row[3],
-            "reach": row[4],
-            "engagement": row[5],
-            "avg_engagement": round(row[6], 1)
-        })
+    day_of_week = [{
+        "day": DOW_NAMES[row[0]],
+        "day_num": row[0],
+        "posts": row[1],
+        "total_engagement": row[2],
+        "avg_engagement": row[3],
+        "views": row[4],
+        "reach": row[5],
+        "is_best": bool(row[6])
+    } for row in cursor]
+
+    # Page rankings (page_stats rows are sorted by engagement)
+    page_rankings = [{
+        "rank": i + 1,
+        "page_id": row[0],
+        "name": row[1],  # For frontend compatibility
+        "page_name": row[1],
+        "posts": row[4],
+        "views": row[10],
+        "reach": row[11],
+        "engagement": row[8],
+        "avg_engagement": row[13]
+    } for i, row in enumerate(page_rows)]
 
     # Post type performance (with normalized types)
-    type_expr = normalize_post_type_sql()
     cursor.execute(f"""
         SELECT
-            {type_expr} as post_type,
-            COUNT(*) as count,
-            COALESCE(SUM(views_count), 0) as views,
-            COALESCE(SUM(reach_count), 0) as reach,
-            COALESCE(SUM(total_engagement), 0) as engagement,
-            COALESCE(AVG(total_engagement), 0) as avg_engagement,
-            COALESCE(AVG(views_count), 0) as avg_views
-        FROM posts
-        WHERE reactions_total > 0 OR comments_count > 0 OR shares_count > 0
-        GROUP BY {type_expr}
-        ORDER BY avg_engagement DESC
+            post_type,
+            SUM(posts) as count,
+            SUM(views) as views,
+            SUM(reach) as reach,
+            SUM(engagement) as engagement,
+            {mv_avg('engagement', 1)} as avg_engagement,
+            {mv_avg('views', 1)} as avg_views,
+            {mv_avg('engagement')} as avg_engagement_raw
+        FROM mv_post_type_stats
+        GROUP BY post_type
+        ORDER BY avg_engagement_raw DESC  -- unrounded, so rounding cannot tie the best type
     """)
 
-    post_type_perf = []
-    best_type = None
-    max_avg_eng = 0
-    for row in cursor.fetchall():
-        avg_eng = row[5]
-        if avg_eng > max_avg_eng:
-            max_avg_eng = avg_eng
-            best_type = row[0]
-        post_type_perf.append({
-            "type": row[0],
-            "count": row[1],
-            "views": row[2],
-            "reach": row[3],
-            "engagement": row[4],
-            "avg_engagement": round(avg_eng, 1),
-            "avg_views": round(row[6], 1)
-        })
+    rows = cursor.fetchall()
+    post_type_perf = [{
+        "type": row[0],
+        "count": row[1],
+        "views": row[2],
+        "reach": row[3],
+        "engagement": row[4],
+        "avg_engagement": row[5],
+        "avg_views": row[6]
+    } for row in rows]
+    # Already sorted by the unrounded average, so the best type is the first
+    # row - as long as that average is above zero before rounding
+    best_type = rows[0][0] if rows and rows[0][7] > 0 else None
 
     # Monthly data by page
-    cursor = conn.cursor()
     cursor.execute(f"""
         SELECT
-            {month_expr} as month,
-            p.page_id,
+            m.month,
+            m.page_id,
             pg.page_name,
-            COUNT(*) as post_count,
-            COALESCE(SUM(p.reactions_total), 0) as reactions,
-            COALESCE(SUM(p.comments_count), 0) as comments,
-            COALESCE(SUM(p.shares_count), 0) as shares,
-            COALESCE(SUM(p.views_count), 0) as views,
-            COALESCE(SUM(p.reach_count), 0) as reach,
-            COALESCE(SUM(p.total_engagement), 0) as engagement,
-            COALESCE(AVG(p.total_engagement), 0) as avg_engagement
-        FROM posts p
-        LEFT JOIN pages pg ON p.page_id = pg.page_id
-        WHERE p.publish_time IS NOT NULL
-            AND (p.reactions_total > 0 OR p.comments_count > 0 OR p.shares_count > 0)
-        GROUP BY {month_expr}, p.page_id
-        ORDER BY month DESC, engagement DESC
+            m.posts as post_count,
+            m.reactions,
+            m.comments,
+            m.shares,
+            m.views,
+            m.reach,
+            m.engagement,
+            {mv_avg('m.engagement', 1)} as avg_engagement
+        FROM mv_monthly_stats m
+        LEFT JOIN pages pg ON m.page_id = pg.page_id
+        GROUP BY m.month, m.page_id
+        ORDER BY m.month DESC, m.engagement DESC
     """)
 
     monthly_by_page_raw = {}
-    for row in cursor.fetchall():
+    for row in cursor:
         month, page_id, page_name = row[0], row[1], row[2]
         if page_id not in monthly_by_page_raw:
             monthly_by_page_raw[page_id] = {"page_name": page_name, "months": {}}
@@ -650,7 +699,7 @@ def export_time_series():
             "views": row[7],
             "reach": row[8],
             "engagement": row[9],
-            "avg_engagement": round(row[10], 1)
+            "avg_engagement": row[10]
         }
 
     # Calculate MoM change per page and build final structure
@@ -675,8 +724,6 @@ def export_time_series():
             "data": list(reversed(page_months))  # Most recent first
         }
 
-    conn.close()
-
     return {
         "monthly": list(reversed(monthly)),  # Most recent first
         "monthlyByPage": monthly_by_page,
@@ -751,36 +798,38 @@ def generate_insights(monthly, weekly, day_of_week, page_rankings, post_type_per
     return insights[:5]  # Limit to 5 insights
 
 
-def export_page_comparison():
+def export_page_comparison(conn):
     """Export detailed page comparison data for the Overlap/Comparison page."""
-    conn = get_conn()
     cursor = conn.cursor()
+    cursor.arraysize = 1000
 
-    # Get comprehensive page stats
-    cursor.execute("""
+    # Get comprehensive page stats, ranked with each page's share of total engagement
+    # (mv_page_type_all_stats covers every post, summed here per page)
+    cursor.execute(f"""
         SELECT
             pg.page_id,
             pg.page_name,
             pg.fan_count,
-            COUNT(p.post_id) as posts,
-            COALESCE(SUM(p.total_engagement), 0) as engagement,
-            COALESCE(AVG(p.total_engagement), 0) as avg_engagement,
-            COALESCE(SUM(p.views_count), 0) as views,
-            COALESCE(SUM(p.reach_count), 0) as reach,
-            COALESCE(SUM(p.reactions_total), 0) as reactions,
-            COALESCE(SUM(p.comments_count), 0) as comments,
-            COALESCE(SUM(p.shares_count), 0) as shares,
-            COALESCE(AVG(p.pes), 0) as avg_pes
+            COALESCE(SUM(m.posts), 0) as posts,
+            COALESCE(SUM(m.engagement), 0) as engagement,
+            {mv_avg('m.engagement', 1)} as avg_engagement,
+            COALESCE(SUM(m.views), 0) as views,
+            COALESCE(SUM(m.reach), 0) as reach,
+            COALESCE(SUM(m.reactions), 0) as reactions,
+            COALESCE(SUM(m.comments), 0) as comments,
+            COALESCE(SUM(m.shares), 0) as shares,
+            {mv_avg('m.pes', 1)} as avg_pes,
+            ROW_NUMBER() OVER (ORDER BY COALESCE(SUM(m.engagement), 0) DESC) as rank,
+            COALESCE(ROUND(COALESCE(SUM(m.engagement), 0) * 100.0
+                           / NULLIF(SUM(COALESCE(SUM(m.engagement), 0)) OVER (), 0), 1), 0) as engagement_share
         FROM pages pg
-        LEFT JOIN posts p ON pg.page_id = p.page_id
+        LEFT JOIN mv_page_type_all_stats m ON pg.page_id = m.page_id
         GROUP BY pg.page_id
-        ORDER BY engagement DESC
+        ORDER BY rank
     """)
 
     pages = []
-    total_engagement = 0
-    for row in cursor.fetchall():
-        total_engagement += row[4]
+    for row in cursor:
         pages.append({
             "page_id": row[0],
             "name": row[1],  # For frontend compatibility
@@ -788,36 +837,32 @@ def export_page_comparison():
             "fan_count": row[2],
             "posts": row[3],
             "engagement": row[4],
-            "avg_engagement": round(row[5], 1),
+            "avg_engagement": row[5],
             "views": row[6],
             "reach": row[7],
             "reactions": row[8],
             "comments": row[9],
             "shares": row[10],
-            "avg_pes": round(row[11], 1)
+            "avg_pes": row[11],
+            "rank": row[12],
+            "engagement_share": row[13]
         })
 
-    # Add rankings and percentages
-    for i, page in enumerate(pages):
-        page["rank"] = i + 1
-        page["engagement_share"] = round((page["engagement"] / total_engagement) * 100, 1) if total_engagement > 0 else 0
-
     # Get post type distribution by page (normalized)
-    type_expr = normalize_post_type_sql()
     cursor.execute(f"""
         SELECT
-            p.page_id,
-            {type_expr.replace('post_type', 'p.post_type')} as post_type,
-            COUNT(*) as count,
-            COALESCE(SUM(p.total_engagement), 0) as engagement,
-            COALESCE(AVG(p.total_engagement), 0) as avg_engagement
-        FROM posts p
-        GROUP BY p.page_id, {type_expr.replace('post_type', 'p.post_type')}
-        ORDER BY p.page_id, count DESC
+            page_id,
+            post_type,
+            posts as count,
+            engagement,
+            {mv_avg('engagement', 1)} as avg_engagement
+        FROM mv_page_type_all_stats
+        GROUP BY page_id, post_type
+        ORDER BY page_id, count DESC
     """)
 
     post_types_by_page = {}
-    for row in cursor.fetchall():
+    for row in cursor:
         page_id = row[0]
         if page_id not in post_types_by_page:
             post_types_by_page[page_id] = []
@@ -825,7 +870,7 @@ def export_page_comparison():
             "type": row[1],
             "count": row[2],
             "engagement": row[3],
-            "avg_engagement": round(row[4], 1)
+            "avg_engagement": row[4]
         })
 
     # Calculate content strategy similarity (which pages focus on same content types)
@@ -839,8 +884,6 @@ def export_page_comparison():
                 "percentage": round((types[0]["count"] / total) * 100, 1) if total > 0 else 0
             }
 
-    conn.close()
-
     return {
         "pages": pages,
         "postTypesByPage": post_types_by_page,
@@ -848,10 +891,10 @@ def export_page_comparison():
     }
 
 
-def export_comment_analysis():
+def export_comment_analysis(conn):
     """Export self-comment vs organic comment analysis data."""
-    conn = get_conn()
     cursor = conn.cursor()
+    cursor.arraysize = 1000
 
     # Overall self-comment stats
     cursor.execute("""
@@ -898,34 +941,23 @@ def export_comment_analysis():
             COUNT(*) as posts_with_comments,
             COALESCE(SUM(p.page_comments), 0) as self_comments,
             COALESCE(SUM(p.comments_count - p.page_comments), 0) as organic_comments,
-            COUNT(CASE WHEN p.has_page_comment = 1 THEN 1 END) as posts_with_self
+            COUNT(CASE WHEN p.has_page_comment = 1 THEN 1 END) as posts_with_self,
+            COALESCE(ROUND(100.0 * SUM(p.page_comments) / NULLIF(SUM(p.comments_count), 0), 1), 0) as self_rate
         FROM posts p
         LEFT JOIN pages pg ON p.page_id = pg.page_id
         WHERE p.comments_count > 0 AND p.page_comments IS NOT NULL
         GROUP BY p.page_id
         ORDER BY self_comments DESC
     """)
-
-    by_page = []
-    for row in cursor.fetchall():
-        total = row[3] + row[4]
-        by_page.append({
-            "page_name": row[0],
-            "page_id": row[1],
-            "posts_with_comments": row[2],
-            "self_comments": row[3],
-            "organic_comments": row[4],
-            "posts_with_self": row[5],
-            "self_rate": round((row[3] / total) * 100, 1) if total > 0 else 0
-        })
+    by_page = rows_as_dicts(cursor)
 
     # Engagement comparison: posts WITH self-comment vs WITHOUT
     cursor.execute("""
         SELECT
-            AVG(CASE WHEN has_page_comment = 1 THEN total_engagement END) as avg_eng_with_self,
-            AVG(CASE WHEN has_page_comment = 0 OR has_page_comment IS NULL THEN total_engagement END) as avg_eng_without_self,
-            AVG(CASE WHEN has_page_comment = 1 THEN reactions_total END) as avg_react_with,
-            AVG(CASE WHEN has_page_comment = 0 OR has_page_comment IS NULL THEN reactions_total END) as avg_react_without
+            AVG(total_engagement) FILTER (WHERE has_page_comment = 1) as avg_eng_with_self,
+            AVG(total_engagement) FILTER (WHERE has_page_comment = 0 OR has_page_comment IS NULL) as avg_eng_without_self,
+            ROUND(COALESCE(AVG(reactions_total) FILTER (WHERE has_page_comment = 1), 0), 1) as avg_react_with,
+            ROUND(COALESCE(AVG(reactions_total) FILTER (WHERE has_page_comment = 0 OR has_page_comment IS NULL), 0), 1) as avg_react_without
         FROM posts
         WHERE comments_count > 0 AND page_comments IS NOT NULL
     """)
@@ -939,8 +971,8 @@ def export_comment_analysis():
         "avg_engagement_with_self": round(avg_with, 1),
         "avg_engagement_without_self": round(avg_without, 1),
         "engagement_boost_pct": engagement_boost,
-        "avg_reactions_with": round(eng_row[2] or 0, 1),
-        "avg_reactions_without": round(eng_row[3] or 0, 1)
+        "avg_reactions_with": eng_row[2],
+        "avg_reactions_without": eng_row[3]
     }
 
     # Top posts with most self-comments
@@ -960,19 +992,15 @@ def export_comment_analysis():
         LIMIT 10
     """)
 
-    top_self_commented = []
-    for row in cursor.fetchall():
-        top_self_commented.append({
-            "post_id": row[0],
-            "page_name": row[1],
-            "title": row[2][:50] if row[2] else "Untitled",
-            "self_comments": row[3],
-            "total_comments": row[4],
-            "engagement": row[5],
-            "permalink": row[6]
-        })
-
-    conn.close()
+    top_self_commented = [{
+        "post_id": row[0],
+        "page_name": row[1],
+        "title": row[2][:50] if row[2] else "Untitled",
+        "self_comments": row[3],
+        "total_comments": row[4],
+        "engagement": row[5],
+        "permalink": row[6]
+    } for row in cursor]
 
     return {
         "summary": summary,
@@ -982,9 +1010,9 @@ def export_comment_analysis():
     }
 
 
-def export_all_posts():
-    conn = get_conn()
+def export_all_posts(conn):
     cursor = conn.cursor()
+    cursor.arraysize = 1000
 
     type_expr = normalize_post_type_sql().replace('post_type', 'p.post_type')
     cursor.execute(f"""
@@ -1002,50 +1030,28 @@ def export_all_posts():
             COALESCE(p.views_count, 0) as views,
             COALESCE(p.reach_count, 0) as reach,
             COALESCE(p.total_engagement, 0) as engagement,
-            COALESCE(p.pes, 0) as pes
+            ROUND(COALESCE(p.pes, 0), 1) as pes
         FROM posts p
         LEFT JOIN pages pg ON p.page_id = pg.page_id
         WHERE p.reactions_total > 0 OR p.comments_count > 0 OR p.shares_count > 0
         ORDER BY p.publish_time DESC
     """)
 
-    all_posts = []
-    for row in cursor.fetchall():
-        all_posts.append({
-            "post_id": row[0],
-            "page_id": row[1],
-            "page_name": row[2],
-            "title": row[3],
-            "post_type": row[4],
-            "publish_time": row[5],
-            "permalink": row[6],
-            "reactions": row[7],
-            "comments": row[8],
-            "shares": row[9],
-            "views": row[10],
-            "reach": row[11],
-            "engagement": row[12],
-            "pes": round(row[13], 1)
-        })
+    # Column aliases are the JSON keys, so rows pass straight through
+    return rows_as_dicts(cursor)
+
 
-    conn.close()
-    return all_posts
+TOP_POST_KEYS = ("post_id", "page_id", "page_name", "title", "post_type", "publish_time",
+                 "permalink", "reactions", "comments", "shares", "engagement", "pes")
 
 
-def export_top_posts(limit=10):
+def export_top_posts(conn, limit=10):
     """Export top performing posts (all pages + per-page)."""
-    conn = get_conn()
     cursor = conn.cursor()
-
-    # Get all pages first
-    cursor.execute("SELECT DISTINCT page_id FROM posts WHERE reactions_total > 0")
-    page_ids = [row[0] for row in cursor.fetchall()]
+    cursor.arraysize = 1000
 
     type_expr = normalize_post_type_sql().replace('post_type', 'p.post_type')
-
-    # All pages top posts
-    cursor.execute(f"""
-        SELECT
+    columns = f"""
             p.post_id,
             p.page_id,
             pg.page_name,
@@ -1057,126 +1063,75 @@ def export_top_posts(limit=10):
             COALESCE(p.comments_count, 0) as comments,
             COALESCE(p.shares_count, 0) as shares,
             COALESCE(p.total_engagement, 0) as engagement,
-            COALESCE(p.pes, 0) as pes
+            ROUND(COALESCE(p.pes, 0), 1) as pes"""
+
+    # All pages top posts
+    cursor.execute(f"""
+        SELECT {columns}
         FROM posts p
         LEFT JOIN pages pg ON p.page_id = pg.page_id
         WHERE p.reactions_total > 0 OR p.comments_count > 0 OR p.shares_count > 0
         ORDER BY p.total_engagement DESC
-        LIMIT {limit}
-    """)
+        LIMIT ?
+    """, (limit,))
+    all_posts = rows_as_dicts(cursor)
 
-    all_posts = []
-    for row in cursor.fetchall():
-        all_posts.append({
-            "post_id": row[0],
-            "page_id": row[1],
-            "page_name": row[2],
-            "title": row[3],
-            "post_type": row[4],
-            "publish_time": row[5],
-            "permalink": row[6],
-            "reactions": row[7],
-            "comments": row[8],
-            "shares": row[9],
-            "engagement": row[10],
-            "pes": round(row[11], 1)
-        })
-
-    # Per-page top posts
-    by_page = {}
-    for page_id in page_ids:
-        cursor.execute(f"""
-            SELECT
-                p.post_id,
-                p.page_id,
-                pg.page_name,
-                p.title,
-                {type_expr} as post_type,
-                p.publish_time,
-                p.permalink,
-                COALESCE(p.reactions_total, 0) as reactions,
-                COALESCE(p.comments_count, 0) as comments,
-                COALESCE(p.shares_count, 0) as shares,
-                COALESCE(p.total_engagement, 0) as engagement,
-                COALESCE(p.pes, 0) as pes
+    # Per-page top posts - every page in one query, numbered within each page.
+    # Only pages with at least one reacted post get an entry.
+    cursor.execute(f"""
+        SELECT {", ".join(TOP_POST_KEYS)}
+        FROM (
+            SELECT {columns},
+                ROW_NUMBER() OVER (PARTITION BY p.page_id ORDER BY p.total_engagement DESC) as rn
             FROM posts p
             LEFT JOIN pages pg ON p.page_id = pg.page_id
-            WHERE p.page_id = ? AND (p.reactions_total > 0 OR p.comments_count > 0 OR p.shares_count > 0)
-            ORDER BY p.total_engagement DESC
-            LIMIT {limit}
-        """, (page_id,))
-
-        page_posts = []
-        for row in cursor.fetchall():
-            page_posts.append({
-                "post_id": row[0],
-                "page_id": row[1],
-                "page_name": row[2],
-                "title": row[3],
-                "post_type": row[4],
-                "publish_time": row[5],
-                "permalink": row[6],
-                "reactions": row[7],
-                "comments": row[8],
-                "shares": row[9],
-                "engagement": row[10],
-                "pes": round(row[11], 1)
-            })
-        by_page[page_id] = page_posts
+            WHERE p.page_id IN (SELECT page_id FROM posts WHERE reactions_total > 0)
+                AND (p.reactions_total > 0 OR p.comments_count > 0 OR p.shares_count > 0)
+        )
+        WHERE rn <= ?
+        ORDER BY page_id, rn
+    """, (limit,))
+    by_page = {}
+    for post in rows_as_dicts(cursor):
+        by_page.setdefault(post["page_id"], []).append(post)
 
-    conn.close()
     return {"all": all_posts, "byPage": by_page}
 
 
-def export_livestream():
+def export_livestream(conn):
     """Export livestream (TikTok + Bigo) data if tables exist."""
-    conn = get_conn()
     cursor = conn.cursor()
+    cursor.arraysize = 1000
 
     # Check if livestream tables exist
     cursor.execute("SELECT name FROM sqlite_master WHERE type='table' AND name='livestream_daily'")
     if not cursor.fetchone():
-        conn.close()
         return None
 
     # Daily data per agent
     cursor.execute("""
-        SELECT date, agent, tk_views, tk_unique_viewers, tk_likes, tk_comments,
+        SELECT date, agent, tk_views, tk_unique_viewers as tk_unique, tk_likes, tk_comments,
                tk_shares, tk_gifters, tk_new_followers, tk_eng_rate,
                bg_viewers, bg_engaged, bg_eng_rate, bg_beans, bg_new_fans, bg_gifts,
                total_engagement, total_reach
         FROM livestream_daily ORDER BY date, agent
     """)
-    daily = []
-    for r in cursor.fetchall():
-        daily.append({
-            "date": r[0], "agent": r[1],
-            "tk_views": r[2], "tk_unique": r[3], "tk_likes": r[4], "tk_comments": r[5],
-            "tk_shares": r[6], "tk_gifters": r[7], "tk_new_followers": r[8], "tk_eng_rate": r[9],
-            "bg_viewers": r[10], "bg_engaged": r[11], "bg_eng_rate": r[12], "bg_beans": r[13],
-            "bg_new_fans": r[14], "bg_gifts": r[15],
-            "total_engagement": r[16], "total_reach": r[17],
-        })
+    daily = rows_as_dicts(cursor)
 
     # Daily aggregated (all agents combined)
     cursor.execute("""
         SELECT date,
-               SUM(tk_views), SUM(tk_unique_viewers), SUM(tk_likes), SUM(tk_comments),
-               SUM(tk_shares), SUM(tk_gifters), SUM(tk_new_followers),
-               SUM(bg_viewers), SUM(bg_engaged), SUM(bg_beans), SUM(bg_new_fans), SUM(bg_gifts),
-               SUM(total_engagement), SUM(total_reach)
+               SUM(tk_views) as tk_views, SUM(tk_unique_viewers) as tk_unique,
+               SUM(tk_likes) as tk_likes, SUM(tk_comments) as tk_comments,
+               SUM(tk_shares) as tk_shares, SUM(tk_gifters) as tk_gifters,
+               SUM(tk_new_followers) as tk_new_followers,
+               SUM(bg_viewers) as bg_viewers, SUM(bg_engaged) as bg_engaged,
+               SUM(bg_beans) as bg_beans, SUM(bg_new_fans) as bg_new_fans,
+               SUM(bg_gifts) as bg_gifts,
+               SUM(total_engagement) as total_engagement, SUM(total_reach) as total_reach
         FROM livestream_daily GROUP BY date ORDER BY date
     """)
-    daily_all = []
-    for r in cursor.fetchall():
-        daily_all.append({
-            "date": r[0],
-            "tk_views": r[1], "tk_unique": r[2], "tk_likes": r[3], "tk_comments": r[4],
-            "tk_shares": r[5], "tk_gifters": r[6], "tk_new_followers": r[7],
-            "bg_viewers": r[8], "bg_engaged": r[9], "bg_beans": r[10],
-            "bg_new_fans": r[11], "bg_gifts": r[12],
-            "total_engagement": r[13], "total_reach": r[14],
-        })
+    daily_all = rows_as_dicts(cursor)
 
     # Per-agent totals
     cursor.execute("""
@@ -1188,7 +1143,7 @@ def export_livestream():
         FROM livestream_daily GROUP BY agent ORDER BY SUM(total_engagement) DESC
     """)
     agent_summaries = {}
-    for r in cursor.fetchall():
+    for r in cursor:
         agent_summaries[r[0]] = {
             "agent": r[0], "days": r[1],
             "tk_views": r[2], "tk_likes": r[3], "tk_comments": r[4], "tk_shares": r[5],
@@ -1200,13 +1155,12 @@ def export_livestream():
 
     # Schedule
     cursor.execute("SELECT date, time, streamer, platform, content, other_task, moderator FROM livestream_schedule ORDER BY date, time")
-    schedule = [{"date": r[0], "time": r[1], "streamer": r[2], "platform": r[3],
-                 "content": r[4], "other_task": r[5], "moderator": r[6]} for r in cursor.fetchall()]
+    schedule = rows_as_dicts(cursor)
 
     # Promo codes
     cursor.execute("SELECT agent, code, status FROM livestream_promo ORDER BY agent, code")
     promo_raw = {}
-    for r in cursor.fetchall():
+    for r in cursor:
         agent = r[0]
         if agent not in promo_raw:
             promo_raw[agent] = {"codes": [], "used": 0, "unused": 0, "expired": 0, "total": 0}
@@ -1239,7 +1193,6 @@ def export_livestream():
         "total_engagement": r[12] or 0, "total_reach": r[13] or 0, "days": r[14] or 0,
     }
 
-    conn.close()
     return {
         "daily": daily,
         "dailyAll": daily_all,
@@ -1251,6 +1204,17 @@ def export_livestream():
     }
 
 
+def run_export(export, *args):
+    """Run export(conn, *args) on a fresh read-only connection (one per worker thread).
+
+    The exports take their connection as a parameter and never close it;
+    closing() here guarantees it is released even if the export raises.
+    """
+    with closing(get_conn()) as conn:
+        conn.execute("PRAGMA query_only = 1")
+        return export(conn, *args)
+
+
 def main():
     print("=" * 60)
     print("Exporting Static Data for Vercel")
@@ -1258,16 +1222,47 @@ def main():
 
     # sync_metrics_to_posts() REMOVED - posts table is now updated directly by API + CSV
 
-    stats_data = export_stats()
-    pages_data = export_pages()
-    post_types_data = export_post_types()
-    daily_data = export_daily()
-    top_posts_data = export_top_posts(10)
-    all_posts_data = export_all_posts()
-    time_series_data = export_time_series()
-    comment_analysis_data = export_comment_analysis()
-    page_comparison_data = export_page_comparison()
-    livestream_data = export_livestream()
+    with closing(get_conn()) as conn:
+        # publish_date is filled first, so the fingerprint sees the stored column
+        ensure_publish_date(conn)
+
+        # Skip the whole export when nothing changed since the last one
+        # (pass --force to rebuild anyway)
+        fingerprint = data_fingerprint(conn)
+        if (fingerprint == get_meta(conn, "export_fingerprint") and os.path.exists(OUTPUT_PATH)
+                and "--force" not in sys.argv):
+            print("\n[SKIP] No data changes since the last export - analytics-v2.json is up to date")
+            return
+
+        ensure_covering_indexes(conn)
+        refresh_materialized_views(conn)
+        page_rows = page_stats(conn)
+
+    # Everything below only reads, so the exports run side by side -
+    # each on its own connection; SQLite readers share the file without blocking
+    with ThreadPoolExecutor(max_workers=6) as pool:
+        futures = {
+            "stats": pool.submit(run_export, export_stats),
+            "postTypes": pool.submit(run_export, export_post_types),
+            "daily": pool.submit(run_export, export_daily),
+            "topPosts": pool.submit(run_export, export_top_posts, 10),
+            "posts": pool.submit(run_export, export_all_posts),
+            "timeSeries": pool.submit(run_export, export_time_series, page_rows),
+            "commentAnalysis": pool.submit(run_export, export_comment_analysis),
+            "pageComparison": pool.submit(run_export, export_page_comparison),
+            "liveStreaming": pool.submit(run_export, export_livestream),
+        }
+        results = {key: future.result() for key, future in futures.items()}
+
+    stats_data = results["stats"]
+    pages_data = export_pages(page_rows)
+    post_types_data = results["postTypes"]
+    daily_data = results["daily"]
+    top_posts_data = results["topPosts"]
+    all_posts_data = results["posts"]
+    time_series_data = results["timeSeries"]
+    comment_analysis_data = results["commentAnalysis"]
+    livestream_data = results["liveStreaming"]
 
     data = {
         "stats": stats_data,
@@ -1279,7 +1274,7 @@ def main():
         "overlaps": [],  # Empty for now, prevents errors
         "timeSeries": time_series_data,
         "commentAnalysis": comment_analysis_data,
-        "pageComparison": page_comparison_data,
+        "pageComparison": results["pageComparison"],
         "liveStreaming": livestream_data,
     }
 
@@ -1327,16 +1322,27 @@ def main():
     else:
         print(f"\nLive Streaming: No data (run fetch_livestream.py first)")
 
-    # Save to file
-    with open(OUTPUT_PATH, 'w') as f:
-        json.dump(data, f, indent=2)
+    # Save to file - compact UTF-8 without escaping non-ASCII titles.
+    # orjson encodes the whole payload to bytes in C; json.dump streams into a 1MB buffer
+    if orjson:
+        with open(OUTPUT_PATH, 'wb') as f:
+            f.write(orjson.dumps(data, option=orjson.OPT_NON_STR_KEYS))
+            f.flush()
+            os.fsync(f.fileno())
+    else:
+        with open(OUTPUT_PATH, 'w', encoding='utf-8', buffering=1 << 20) as f:
+            json.dump(data, f, separators=(',', ':'), ensure_ascii=False)
+            f.flush()
+            os.fsync(f.fileno())
+
+    with closing(get_conn()) as conn:
+        set_meta(conn, "export_fingerprint", fingerprint)
 
     print(f"\n[OK] Exported to: {OUTPUT_PATH}")
 
     # Run pre-deploy verification
     print("\n--- Running pre-deploy verification ---")
     import subprocess
-    import sys
     result = subprocess.run([sys.executable, 'smart_verify.py', '--pre-deploy'])
 
     if result.returncode != 0:
@@ -2,13 +2,89 @@
 """Facebook Graph API client for fetching page data."""
 
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 import json
+import os
 import time
 from datetime import datetime, timedelta
 from typing import Optional, Dict, List, Any
 
+# orjson (C decoder) is optional - fall back to the stdlib json module
+try:
+    from orjson import loads as json_loads
+except ImportError:
+    from json import loads as json_loads
+
+try:
+    import requests_cache
+except ImportError:
+    requests_cache = None
+
 API_VERSION = "v21.0"
 BASE_URL = f"https://graph.facebook.com/{API_VERSION}"
+REACTION_TYPES = ("LIKE", "LOVE", "WOW", "HAHA", "SAD", "ANGRY")
+
+# Facebook reports how close we are to the rate limit (0-100%) in the
+# response headers; only back off once usage reaches this level
+USAGE_THROTTLE_PCT = 80
+
+# Opt-in on-disk response cache for dev iteration and reruns after a crash
+# (needs requests-cache). Seconds; 0 keeps every request live.
+CACHE_TTL = int(os.environ.get("FB_API_CACHE_TTL", "0"))
+# Stored bodies include paging URLs with the access token, so the cache lives
+# in the user cache directory (use_cache_dir), never in the repo
+CACHE_PATH = "juanbabes_fb_api_cache"
+# Post listings change as soon as a page publishes, so keep them short-lived
+CACHE_URLS_EXPIRE_AFTER = {"graph.facebook.com/*/posts": 300}
+
+
+def rate_limit_usage(headers) -> int:
+    """Highest usage percentage reported in X-App/X-Page/X-Business-Use-Case-Usage headers."""
+    usage = 0
+    for header in ("X-App-Usage", "X-Page-Usage"):
+        if header in headers:
+            try:
+                usage = max([usage, *json.loads(headers[header]).values()])
+            except (ValueError, TypeError, AttributeError):
+                pass
+    if "X-Business-Use-Case-Usage" in headers:
+        try:
+            for entries in json.loads(headers["X-Business-Use-Case-Usage"]).values():
+                for entry in entries:
+                    usage = max(usage, entry.get("call_count", 0), entry.get("total_cputime", 0),
+                                entry.get("total_time", 0))
+        except (ValueError, TypeError, AttributeError):
+            pass
+    return usage
+
+
+def throttle(response) -> None:
+    """Sleep only when Facebook says we are near the rate limit (2s at 80%, up to 42s at 100%)."""
+    usage = rate_limit_usage(response.headers)
+    if usage >= USAGE_THROTTLE_PCT:
+        time.sleep(min(usage - USAGE_THROTTLE_PCT + 1, 21) * 2)
+
+
+# (connect, read) seconds for the standalone fetch scripts
+TIMEOUT = (5, 30)
+
+
+def make_session(session: Optional[requests.Session] = None) -> requests.Session:
+    """Keep-alive session for the fetch scripts' Graph API calls.
+
+    One session per script is shared by all its worker threads, so requests
+    reuse TLS connections to graph.facebook.com; transient 429/5xx responses
+    are retried with backoff. Pass an existing session (e.g. a requests-cache
+    CachedSession) to mount the same adapter on it.
+    """
+    if session is None:
+        session = requests.Session()
+    session.mount("https://", HTTPAdapter(
+        pool_connections=1, pool_maxsize=32,
+        max_retries=Retry(total=3, backoff_factor=0.2, status_forcelist=[429, 500, 502, 503, 504],
+                          raise_on_status=False)))
+    return session
 
 
 class FacebookAPI:
@@ -17,6 +93,18 @@ class FacebookAPI:
     def __init__(self, access_token: str):
         self.access_token = access_token
 
+        # Keep-alive connection pool; transient 429/5xx responses are retried
+        # with backoff before _make_request sees them
+        if CACHE_TTL and requests_cache:
+            self.session = requests_cache.CachedSession(
+                CACHE_PATH, backend="sqlite", use_cache_dir=True, expire_after=CACHE_TTL,
+                urls_expire_after=CACHE_URLS_EXPIRE_AFTER, cache_control=True)
+        else:
+            self.session = requests.Session()
+        retry = Retry(total=3, backoff_factor=0.5, status_forcelist=[429, 500, 502, 503, 504],
+                      raise_on_status=False)
+        self.session.mount("https://", HTTPAdapter(pool_connections=4, pool_maxsize=32, max_retries=retry))
+
     def _make_request(self, endpoint: str, params: Optional[Dict] = None) -> Dict:
         """Make a request to the Facebook Graph API."""
         if params is None:
@@ -24,14 +112,17 @@ class FacebookAPI:
         params["access_token"] = self.access_token
 
         url = f"{BASE_URL}/{endpoint}"
-        response = requests.get(url, params=params)
+        response = self.session.get(url, params=params, timeout=10)
 
         if response.status_code != 200:
-            error_data = response.json()
+            error_data = json_loads(response.content)
             error_msg = error_data.get("error", {}).get("message", "Unknown error")
             raise Exception(f"API Error: {error_msg}")
 
-        return response.json()
+        # A cached response's usage headers are stale - only throttle live calls
+        if not getattr(response, "from_cache", False):
+            throttle(response)
+        return json_loads(response.content)
 
     def get_page_info(self, page_id: str) -> Dict:
         """Get page information."""
@@ -85,30 +176,28 @@ class FacebookAPI:
             else:
                 break
 
-            # Rate limiting
-            time.sleep(0.5)
-
         return all_posts
 
     def get_post_reactions(self, post_id: str) -> Dict[str, int]:
-        """Get detailed reaction breakdown for a post."""
-        reactions = {}
-        reaction_types = ["LIKE", "LOVE", "WOW", "HAHA", "SAD", "ANGRY"]
-
-        for reaction_type in reaction_types:
-            endpoint = f"{post_id}/reactions"
-            params = {"type": reaction_type, "summary": "total_count", "limit": 0}
-
-            try:
-                data = self._make_request(endpoint, params)
-                count = data.get("summary", {}).get("total_count", 0)
-                reactions[reaction_type.lower()] = count
-            except Exception:
-                reactions[reaction_type.lower()] = 0
+        """Get detailed reaction breakdown for a post.
+
+        All six per-type counts come back in one request: each type is an
+        aliased reactions summary, e.g. reactions.type(LOVE)...as(love).
+        """
+        fields = ",".join(
+            f"reactions.type({reaction_type}).limit(0).summary(total_count).as({reaction_type.lower()})"
+            for reaction_type in REACTION_TYPES
+        )
 
-            time.sleep(0.2)  # Rate limiting
+        try:
+            data = self._make_request(post_id, {"fields": fields})
+        except Exception:
+            data = {}
 
-        return reactions
+        return {
+            reaction_type.lower(): data.get(reaction_type.lower(), {}).get("summary", {}).get("total_count", 0)
+            for reaction_type in REACTION_TYPES
+        }
 
     def get_post_comments(self, post_id: str, page_id: str) -> Dict:
         """Get comments for a post, identifying page self-comments."""
@@ -156,6 +245,10 @@ class FacebookAPI:
             return {}
 
 
+# Attachment media_type -> stored post_type (anything else is TEXT)
+MEDIA_POST_TYPES = {"video": "VIDEO", "photo": "IMAGE", "album": "CAROUSEL"}
+
+
 def classify_post_type(post: Dict) -> str:
     """Classify post type based on attachments."""
     attachments = post.get("attachments", {}).get("data", [])
@@ -164,19 +257,14 @@ def classify_post_type(post: Dict) -> str:
         return "TEXT"
 
     attachment = attachments[0]
-    media_type = attachment.get("media_type", "").lower()
-    attach_type = attachment.get("type", "").lower()
+    post_type = MEDIA_POST_TYPES.get(attachment.get("media_type", "").lower(), "TEXT")
 
-    if media_type == "video":
+    # Only videos can be reels, so only they need the attachment type
+    if post_type == "VIDEO":
+        attach_type = attachment.get("type", "").lower()
         if "reel" in attach_type or "video_inline" in attach_type:
             return "REEL"
-        return "VIDEO"
-    elif media_type == "photo":
-        return "IMAGE"
-    elif media_type == "album":
-        return "CAROUSEL"
-    else:
-        return "TEXT"
+    return post_type
 
 
 def calculate_engagement_metrics(post_data: Dict) -> Dict:
@@ -267,9 +355,6 @@ def fetch_page_data(page_access_token: str, page_id: str, days_back: int = 90) -
 
         processed_posts.append(post_data)
 
-        # Rate limiting
-        time.sleep(0.3)
-
     print()  # New line after progress
 
     return {
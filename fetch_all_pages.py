@@ -1,50 +1,106 @@
 #!/usr/bin/env python3
-"""Fetch data from all 5 Facebook pages in PARALLEL and store in database."""
+"""Fetch data from all 5 Facebook pages in PARALLEL and store in database.
+
+Usage:
+    python fetch_all_pages.py          # skip posts whose stored metrics are still fresh
+    python fetch_all_pages.py --full   # re-fetch every post in the window
+"""
 
-import json
 import sqlite3
-import requests
+import sys
 import time
-from datetime import datetime, timedelta
+from functools import lru_cache
+from typing import NamedTuple
+from datetime import datetime, timedelta, timezone
 from concurrent.futures import ThreadPoolExecutor, as_completed
-from facebook_api import FacebookAPI, calculate_engagement_metrics
-
-
-def classify_post_type(post):
-    """Classify post type based on type and status_type fields."""
-    post_type = post.get("type", "").lower()
-    status_type = post.get("status_type", "").lower()
-
-    if post_type == "video":
-        if "reel" in status_type:
-            return "Reels"
-        if "live" in status_type:
-            return "Live"
-        return "Videos"
-    elif post_type == "photo":
-        return "Photos"
-    elif post_type == "link":
-        return "Link"
-    elif status_type == "added_photos":
-        return "Photos"
-    elif status_type == "added_video":
-        return "Videos"
-    elif status_type == "shared_story":
-        return "Share"
-    else:
-        return "Text"
-
-
-# Load page tokens
-with open("page_tokens.json", "r") as f:
-    PAGE_TOKENS = json.load(f)
+from facebook_api import FacebookAPI, TIMEOUT, calculate_engagement_metrics, make_session, throttle
+
+# orjson (C decoder) is optional - fall back to the stdlib json module
+try:
+    from orjson import loads as json_loads
+except ImportError:
+    from json import loads as json_loads
+
+
+# Attachment media_type -> stored post_type (anything else is TEXT)
+MEDIA_POST_TYPES = {"video": "VIDEO", "photo": "IMAGE", "album": "IMAGE"}
+
+# Per-post detail fields; the Graph API accepts up to 50 ids per ?ids= request
+POST_FIELDS = "reactions.summary(total_count),comments.summary(total_count),shares,attachments{media_type}"
+IDS_PER_REQUEST = 50
+
 
 DATABASE_PATH = "data/juanbabes_analytics.db"
+DAYS_BACK = 90
+
+_INSERT_PAGE_SQL = """
+    INSERT OR REPLACE INTO pages
+    (page_id, page_name, fan_count, followers_count, category, link, created_at, updated_at)
+    VALUES (?, ?, ?, ?, ?, ?, COALESCE((SELECT created_at FROM pages WHERE page_id = ?), ?), ?)
+"""
+
+_INSERT_POST_SQL = """
+    INSERT OR REPLACE INTO posts
+    (post_id, page_id, title, permalink, post_type, publish_time,
+     reactions_total, reactions_like, reactions_love, reactions_haha,
+     reactions_wow, reactions_sad, reactions_angry,
+     comments_count, shares_count, page_comments, has_page_comment,
+     pes, qes, viral_coefficient, total_engagement, fetched_at)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+"""
+
+# How long a stored post's metrics stay fresh, by post age. Engagement on old
+# posts barely moves, so they are re-fetched far less often than new ones.
+REFRESH_AFTER = (
+    (timedelta(days=1), timedelta(0)),       # < 1 day old: every run
+    (timedelta(days=7), timedelta(hours=6)),  # 1-7 days old: every 6 hours
+)
+REFRESH_AFTER_OLD = timedelta(days=1)         # > 7 days old: daily
+
+
+class PostRow(NamedTuple):
+    """One posts-table row, in _INSERT_POST_SQL column order."""
+    post_id: str
+    page_id: str
+    title: str
+    permalink: str
+    post_type: str
+    publish_time: str
+    reactions_total: int
+    reactions_like: int
+    reactions_love: int
+    reactions_haha: int
+    reactions_wow: int
+    reactions_sad: int
+    reactions_angry: int
+    comments_count: int
+    shares_count: int
+    page_comments: int
+    has_page_comment: int
+    pes: float
+    qes: float
+    viral_coefficient: float
+    total_engagement: int
+    fetched_at: str
+
+SESSION = make_session()
+
+
+@lru_cache(maxsize=1)
+def load_page_tokens():
+    """Read page_tokens.json on first use, so importing this module stays cheap."""
+    with open("page_tokens.json", "rb") as f:
+        return json_loads(f.read())
 
 
 def init_database():
     """Initialize the database with updated schema."""
     conn = sqlite3.connect(DATABASE_PATH, check_same_thread=False)
+    conn.execute("PRAGMA journal_mode = WAL")
+    conn.execute("PRAGMA synchronous = NORMAL")
+    conn.execute("PRAGMA temp_store = MEMORY")
+    # Wait for a concurrent export/reader instead of failing with "database is locked"
+    conn.execute("PRAGMA busy_timeout = 5000")
     cursor = conn.cursor()
 
     cursor.execute("""
@@ -89,65 +145,115 @@ def init_database():
         )
     """)
 
+    # Indexes for the export's top-K queries, so ORDER BY ... LIMIT walks
+    # the index instead of sorting every post
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_posts_pg_eng ON posts(page_id, total_engagement DESC)")
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS idx_posts_eng ON posts(total_engagement DESC)
+        WHERE reactions_total > 0 OR comments_count > 0 OR shares_count > 0
+    """)
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS idx_posts_self_cmt ON posts(page_comments DESC)
+        WHERE page_comments > 0
+    """)
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_posts_publish ON posts(publish_time DESC)")
+
     conn.commit()
     return conn
 
 
-def fetch_page_posts(token, page_id, days_back=90):
-    """Fetch all posts from a page."""
-    since_date = datetime.now() - timedelta(days=days_back)
+def fetch_page_posts(token, page_id, since):
+    """Yield a page's posts published after the `since` unix timestamp, one
+    API page (up to 100 posts) at a time. Raises RuntimeError on an API error.
+    """
     # Only basic fields - type/status_type/shares are deprecated
     fields = "id,message,created_time,permalink_url"
 
-    all_posts = []
     url = f"https://graph.facebook.com/v21.0/{page_id}/posts"
     params = {
         "access_token": token,
         "fields": fields,
         "limit": 100,
-        "since": int(since_date.timestamp())
+        "since": since
     }
 
-    while True:
-        try:
-            resp = requests.get(url, params=params)
-            data = resp.json()
+    while url:
+        resp = SESSION.get(url, params=params, timeout=TIMEOUT)
+        data = json_loads(resp.content)
 
-            if "error" in data:
-                return {"error": data['error'].get('message', 'Unknown')}
+        if "error" in data:
+            raise RuntimeError(data['error'].get('message', 'Unknown'))
 
-            posts = data.get("data", [])
-            all_posts.extend(posts)
+        # Back off only when the usage headers say we are near the limit
+        throttle(resp)
 
-            paging = data.get("paging", {})
-            next_url = paging.get("next")
+        yield data.get("data", [])
 
-            if next_url:
-                url = next_url
-                params = {}
-            else:
-                break
+        url = data.get("paging", {}).get("next")
+        params = {}
 
-            time.sleep(0.1)
 
-        except Exception as e:
-            return {"error": str(e)}
+def needs_refresh(post, fetched_at, now):
+    """Whether a listed post is due for a new detail fetch."""
+    if not fetched_at:
+        return True
+    try:
+        created = datetime.strptime(post["created_time"], "%Y-%m-%dT%H:%M:%S%z")
+        last_fetch = datetime.fromisoformat(fetched_at)
+    except (KeyError, TypeError, ValueError):
+        return True
+
+    age = datetime.now(timezone.utc) - created
+    refresh_after = REFRESH_AFTER_OLD
+    for max_age, interval in REFRESH_AFTER:
+        if age < max_age:
+            refresh_after = interval
+            break
+    return now - last_fetch >= refresh_after
+
+
+def _fetch_ids(token, post_ids):
+    """One ?ids= request; returns the nodes keyed by post_id, or None on failure."""
+    params = {
+        "access_token": token,
+        "ids": ",".join(post_ids),
+        "fields": POST_FIELDS
+    }
+    try:
+        resp = SESSION.get("https://graph.facebook.com/v21.0/", params=params, timeout=TIMEOUT)
+        data = json_loads(resp.content)
+    except Exception:
+        return None
+
+    if "error" in data:
+        return None
+
+    throttle(resp)
+    return data
 
-    return all_posts
 
+def fetch_post_details(token, post_ids):
+    """Fetch reactions/comments/shares/type for up to 50 posts in one ?ids= request.
 
-def process_post(token, post, page_id):
-    """Process a single post to get reactions/comments/shares/type."""
+    A single bad id fails the whole request, so a failed batch is retried one
+    id at a time. Returns a dict keyed by post_id; posts that could not be
+    fetched are missing from it and must not be saved.
+    """
+    data = _fetch_ids(token, post_ids)
+    if data is None:
+        data = {}
+        if len(post_ids) > 1:
+            for post_id in post_ids:
+                data.update(_fetch_ids(token, [post_id]) or {})
+    return data
+
+
+def process_post(post, data, page_id, fetched_at):
+    """Build a PostRow from a listing entry and its fetch_post_details() node.
+    Returns None for a malformed node, so stored metrics are not zeroed."""
     post_id = post["id"]
 
     try:
-        url = f"https://graph.facebook.com/v21.0/{post_id}"
-        params = {
-            "access_token": token,
-            "fields": "reactions.summary(total_count),comments.summary(total_count),shares,attachments{media_type}"
-        }
-        resp = requests.get(url, params=params)
-        data = resp.json()
         total_reactions = data.get("reactions", {}).get("summary", {}).get("total_count", 0)
         comments_count = data.get("comments", {}).get("summary", {}).get("total_count", 0)
         shares_count = data.get("shares", {}).get("count", 0)
@@ -155,48 +261,41 @@ def process_post(token, post, page_id):
         # Get post type from attachments
         attachments = data.get("attachments", {}).get("data", [])
         if attachments:
-            media_type = attachments[0].get("media_type", "").lower()
-            if media_type == "video":
-                post_type = "VIDEO"
-            elif media_type == "photo":
-                post_type = "IMAGE"
-            elif media_type == "album":
-                post_type = "IMAGE"
-            else:
-                post_type = "TEXT"
+            post_type = MEDIA_POST_TYPES.get(attachments[0].get("media_type", "").lower(), "TEXT")
         else:
             post_type = "TEXT"
-    except:
-        total_reactions = 0
-        comments_count = 0
-        shares_count = 0
-        post_type = "TEXT"
-
-    reactions = {"like": total_reactions, "love": 0, "haha": 0, "wow": 0, "sad": 0, "angry": 0}
+    except (AttributeError, TypeError, IndexError):
+        return None
 
+    # Only the reaction total is fetched; it is all counted as likes
     metrics = calculate_engagement_metrics({
-        "reactions": reactions,
+        "reactions": {"like": total_reactions},
         "comments_count": comments_count,
         "shares_count": shares_count
     })
 
-    return {
-        "post_id": post_id,
-        "message": (post.get("message", "") or "")[:500],
-        "created_time": post.get("created_time"),
-        "permalink": post.get("permalink_url"),
-        "post_type": post_type,
-        "reactions": reactions,
-        "reactions_total": total_reactions,
-        "comments_count": comments_count,
-        "shares_count": shares_count,
-        "page_comments": 0,
-        "has_page_comment": False,
-        "metrics": metrics
-    }
-
-
-def fetch_single_page(label, data):
+    return PostRow(
+        post_id,
+        page_id,
+        (post.get("message") or "")[:200],  # posts.title width
+        post.get("permalink_url"),
+        post_type,
+        post.get("created_time"),
+        total_reactions,
+        total_reactions, 0, 0, 0, 0, 0,
+        comments_count,
+        shares_count,
+        0,
+        0,
+        metrics["pes"],
+        metrics["qes"],
+        metrics["viral_coefficient"],
+        metrics["total_engagement"],
+        fetched_at
+    )
+
+
+def fetch_single_page(label, data, since, fetched=None):
     """Fetch all data for a single page. Returns (page_data, posts_data)."""
     if "error" in data:
         return {"label": label, "error": data['error'], "posts": []}
@@ -210,24 +309,46 @@ def fetch_single_page(label, data):
 
     print(f"  [{page_name}] Fetching posts...")
 
-    # Fetch posts
-    posts = fetch_page_posts(token, page_id, days_back=90)
+    # Post details are fetched 50 ids per request, 5 requests at a time to
+    # avoid rate limits. Batches are submitted as soon as the listing pages
+    # arrive, so detail requests overlap the rest of the pagination.
+    now = datetime.now()
+    fetched_at = now.isoformat()
+    found = 0
+    pending = []
+    futures = {}
+    processed_posts = []
+    with ThreadPoolExecutor(max_workers=5) as executor:
+        def submit(batch):
+            futures[executor.submit(fetch_post_details, token, [post["id"] for post in batch])] = batch
 
-    if isinstance(posts, dict) and "error" in posts:
-        return {"label": label, "page_data": data, "error": posts["error"], "posts": []}
+        try:
+            for posts in fetch_page_posts(token, page_id, since):
+                found += len(posts)
+                # Only hit the detail endpoint for posts whose stored metrics are stale
+                if fetched:
+                    posts = [post for post in posts if needs_refresh(post, fetched.get(post["id"]), now)]
+                pending.extend(posts)
+                while len(pending) >= IDS_PER_REQUEST:
+                    submit(pending[:IDS_PER_REQUEST])
+                    pending = pending[IDS_PER_REQUEST:]
+        except Exception as e:
+            for future in futures:
+                future.cancel()
+            return {"label": label, "page_data": data, "error": str(e), "posts": []}
 
-    print(f"  [{page_name}] Found {len(posts)} posts, processing...")
+        if pending:
+            submit(pending)
+        queued = sum(len(batch) for batch in futures.values())
+        print(f"  [{page_name}] Found {found} posts, {found - queued} still fresh, processing {queued}...")
 
-    # Process posts in parallel (5 at a time to avoid rate limits)
-    processed_posts = []
-    with ThreadPoolExecutor(max_workers=5) as executor:
-        futures = {executor.submit(process_post, token, post, page_id): post for post in posts}
+        # Posts whose details could not be fetched are left out, so their
+        # stored metrics and fetched_at stay as they were
         for future in as_completed(futures):
-            try:
-                result = future.result()
-                processed_posts.append(result)
-            except Exception as e:
-                pass
+            details = future.result()
+            rows = (process_post(post, details[post["id"]], page_id, fetched_at)
+                    for post in futures[future] if post["id"] in details)
+            processed_posts.extend(row for row in rows if row)
 
     print(f"  [{page_name}] Done! {len(processed_posts)} posts processed")
 
@@ -243,21 +364,15 @@ def save_results(conn, results):
     """Save all results to database."""
     cursor = conn.cursor()
     now = datetime.now().isoformat()
-    total_posts = 0
 
+    page_rows = []
+    post_rows = []
     for result in results:
         if result.get("error"):
             continue
 
         page_data = result.get("page_data", {})
-        posts = result.get("posts", [])
-
-        # Save page
-        cursor.execute("""
-            INSERT OR REPLACE INTO pages
-            (page_id, page_name, fan_count, followers_count, category, link, created_at, updated_at)
-            VALUES (?, ?, ?, ?, ?, ?, COALESCE((SELECT created_at FROM pages WHERE page_id = ?), ?), ?)
-        """, (
+        page_rows.append((
             page_data["page_id"],
             page_data["page_name"],
             page_data.get("fan_count"),
@@ -269,47 +384,18 @@ def save_results(conn, results):
             now
         ))
 
-        # Save posts
-        for post_data in posts:
-            reactions = post_data.get("reactions", {})
-            metrics = post_data.get("metrics", {})
-
-            cursor.execute("""
-                INSERT OR REPLACE INTO posts
-                (post_id, page_id, title, permalink, post_type, publish_time,
-                 reactions_total, reactions_like, reactions_love, reactions_haha,
-                 reactions_wow, reactions_sad, reactions_angry,
-                 comments_count, shares_count, page_comments, has_page_comment,
-                 pes, qes, viral_coefficient, total_engagement, fetched_at)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-            """, (
-                post_data["post_id"],
-                page_data["page_id"],
-                post_data.get("message", "")[:200],
-                post_data.get("permalink"),
-                post_data.get("post_type"),
-                post_data.get("created_time"),
-                post_data.get("reactions_total", 0),
-                reactions.get("like", 0),
-                reactions.get("love", 0),
-                reactions.get("haha", 0),
-                reactions.get("wow", 0),
-                reactions.get("sad", 0),
-                reactions.get("angry", 0),
-                post_data.get("comments_count", 0),
-                post_data.get("shares_count", 0),
-                post_data.get("page_comments", 0),
-                1 if post_data.get("has_page_comment") else 0,
-                metrics.get("pes", 0),
-                metrics.get("qes", 0),
-                metrics.get("viral_coefficient", 0),
-                metrics.get("total_engagement", 0),
-                now
-            ))
-            total_posts += 1
+        # process_post already built bindable PostRow tuples
+        post_rows.extend(result.get("posts", []))
 
-    conn.commit()
-    return total_posts
+    # Insert in primary-key order so consecutive rows land on the same
+    # posts b-tree pages (post_id is the first column and unique)
+    post_rows.sort()
+
+    # Pages and posts in one transaction, one executemany each
+    with conn:
+        cursor.executemany(_INSERT_PAGE_SQL, page_rows)
+        cursor.executemany(_INSERT_POST_SQL, post_rows)
+    return len(post_rows)
 
 
 def main():
@@ -324,21 +410,29 @@ def main():
     # Fetch all pages in parallel
     print("\nFetching all pages in parallel...")
     start_time = time.time()
+    # One cutoff for every page, computed once rather than per page
+    since = int((datetime.now() - timedelta(days=DAYS_BACK)).timestamp())
+
+    # Last fetch time of every stored post, for the skip-if-fresh check
+    fetched = {}
+    if "--full" not in sys.argv:
+        fetched = dict(conn.execute("SELECT post_id, fetched_at FROM posts WHERE fetched_at IS NOT NULL"))
 
+    # Each page is saved as soon as it finishes, so a crash or a failing page
+    # keeps everything fetched before it. Only this thread writes.
     results = []
+    total_posts = 0
     with ThreadPoolExecutor(max_workers=5) as executor:
-        futures = {executor.submit(fetch_single_page, label, data): label
-                   for label, data in PAGE_TOKENS.items()}
+        futures = {executor.submit(fetch_single_page, label, data, since, fetched): label
+                   for label, data in load_page_tokens().items()}
 
         for future in as_completed(futures):
             result = future.result()
             results.append(result)
             if result.get("error"):
                 print(f"  [{result['label']}] ERROR: {result['error']}")
-
-    # Save all results
-    print("\nSaving to database...")
-    total_posts = save_results(conn, results)
+            else:
+                total_posts += save_results(conn, [result])
     conn.close()
 
     elapsed = time.time() - start_time
@@ -4,7 +4,8 @@ Fetch comment data from Facebook Graph API to analyze self-comments vs organic c
 
 This script:
 1. Gets all posts from the database
-2. Fetches comments for each post from Facebook API (in parallel)
+2. Fetches comments from each page's feed, then in 50-post batch requests for
+   any post the feed did not cover (in parallel)
 3. Counts self-comments (from page) vs organic comments (from users)
 4. Updates the database with the breakdown
 
@@ -14,42 +15,63 @@ Usage:
     python fetch_comments.py --workers 10  # Use 10 parallel workers
 """
 
+import json
 import sqlite3
 import requests
 import time
 import argparse
-from datetime import datetime
+from datetime import datetime, timedelta
 from concurrent.futures import ThreadPoolExecutor, as_completed
-import threading
+import itertools
+from functools import lru_cache
+from facebook_api import TIMEOUT, make_session, throttle
 
-DATABASE_PATH = "data/juanbabes_analytics.db"
+# orjson (C decoder) is optional - fall back to the stdlib json module
+try:
+    from orjson import loads as json_loads
+except ImportError:
+    from json import loads as json_loads
 
-# Load page tokens from page_tokens.json
-import json
-with open("page_tokens.json", "r") as f:
-    _tokens_data = json.load(f)
+DATABASE_PATH = "data/juanbabes_analytics.db"
 
-# Build PAGE_TOKENS: api_page_id -> token
-PAGE_TOKENS = {}
-PAGE_NAME_TO_API_ID = {}
-for name, data in _tokens_data.items():
-    if "page_id" in data and "page_access_token" in data:
-        PAGE_TOKENS[data["page_id"]] = data["page_access_token"]
-        PAGE_NAME_TO_API_ID[data["page_name"].lower()] = data["page_id"]
+_UPDATE_COMMENTS_SQL = """
+    UPDATE posts
+    SET page_comments = ?, has_page_comment = ?
+    WHERE post_id = ?
+"""
 
 # Map database page_id (from CSV) to API page_id
 PAGE_ID_MAP = {}
+# database page_id -> (token, api_page_id), filled alongside PAGE_ID_MAP
+PAGE_LOOKUP = {}
+
+SESSION = make_session()
+
+# Comment total plus the first 100 commenters, inline with a post or feed entry
+COMMENTS_FIELD = "comments.limit(100).summary(total_count){from}"
+# Graph API batch requests take at most 50 sub-requests
+BATCH_SIZE = 50
+# Feed pages walked per page at most; posts not reached go to the batch fallback
+MAX_FEED_PAGES = 40
+
 
-# Thread-safe counter
-class Counter:
-    def __init__(self):
-        self.value = 0
-        self.lock = threading.Lock()
+@lru_cache(maxsize=1)
+def load_page_tokens():
+    """
+    Read page_tokens.json on first use, so importing this module stays cheap.
+    Returns: (api_page_id -> token, lowercased page name -> api_page_id)
+    """
+    with open("page_tokens.json", "rb") as f:
+        tokens_data = json_loads(f.read())
+
+    page_tokens = {}
+    page_name_to_api_id = {}
+    for name, data in tokens_data.items():
+        if "page_id" in data and "page_access_token" in data:
+            page_tokens[data["page_id"]] = data["page_access_token"]
+            page_name_to_api_id[data["page_name"].lower()] = data["page_id"]
+    return page_tokens, page_name_to_api_id
 
-    def increment(self, amount=1):
-        with self.lock:
-            self.value += amount
-            return self.value
 
 def build_page_id_map():
     """Build mapping from CSV page IDs to Graph API page IDs based on page names."""
@@ -60,104 +82,185 @@ def build_page_id_map():
     csv_pages = [(row[0], row[1]) for row in cursor.fetchall() if row[1]]
     conn.close()
 
-    # First pass: exact matches
-    for csv_page_id, page_name in csv_pages:
-        name_lower = page_name.lower().strip()
-        for api_name, api_id in PAGE_NAME_TO_API_ID.items():
-            if name_lower == api_name.lower().strip():
-                PAGE_ID_MAP[csv_page_id] = api_id
-                break
+    page_tokens, page_name_to_api_id = load_page_tokens()
 
-    # Second pass: fuzzy matches for unmatched pages
+    # Normalize every API page name once; reversed so the first page listed
+    # wins a name clash, as the old first-match scan did
+    exact_api = {api_name.strip(): api_id
+                 for api_name, api_id in reversed(list(page_name_to_api_id.items()))}
+    normalized_api = {api_name.replace(" ", ""): api_id
+                      for api_name, api_id in reversed(list(page_name_to_api_id.items()))}
+
+    # Exact match first, then ignoring spaces
     for csv_page_id, page_name in csv_pages:
-        if csv_page_id in PAGE_ID_MAP:
-            continue
         name_lower = page_name.lower().strip()
-        name_normalized = name_lower.replace(" ", "")
-        for api_name, api_id in PAGE_NAME_TO_API_ID.items():
-            api_normalized = api_name.lower().replace(" ", "")
-            if name_normalized == api_normalized:
-                PAGE_ID_MAP[csv_page_id] = api_id
-                break
+        api_id = exact_api.get(name_lower) or normalized_api.get(name_lower.replace(" ", ""))
+        if api_id:
+            PAGE_ID_MAP[csv_page_id] = api_id
 
+    PAGE_LOOKUP.update({db_id: (page_tokens[api_id], api_id)
+                        for db_id, api_id in PAGE_ID_MAP.items() if api_id in page_tokens})
     return PAGE_ID_MAP
 
 
-def get_token_for_page(db_page_id):
-    """Get the API token for a page based on database page_id."""
-    api_page_id = PAGE_ID_MAP.get(db_page_id)
-    if api_page_id:
-        return PAGE_TOKENS.get(api_page_id), api_page_id
-    return None, None
+def count_self_comments(comments, api_page_id):
+    """
+    Count self-comments vs organic in a comments edge, following its paging.
+    The first 100 commenters come inline with the post, so only posts with
+    more than 100 comments need further requests.
+    Returns: (self_comments, organic_comments, has_page_comment), or None if
+    a follow-up page could not be fetched - a partial count would book the
+    unseen self-comments as organic.
+    """
+    total_comments = comments.get("summary", {}).get("total_count", 0)
+    self_comments = 0
+
+    while True:
+        for comment in comments.get("data", []):
+            if comment.get("from", {}).get("id", "") == api_page_id:
+                self_comments += 1
+
+        url = comments.get("paging", {}).get("next")
+        if not url:
+            break
+        try:
+            response = SESSION.get(url, timeout=TIMEOUT)
+        except requests.RequestException:
+            return None
+        # Graph API errors come with a non-200 status; skip parsing their body
+        if response.status_code != 200:
+            return None
+        comments = json_loads(response.content)
+        # Back off only when the usage headers say we are near the limit
+        throttle(response)
+
+    organic_comments = max(total_comments - self_comments, 0)
+    has_page_comment = self_comments > 0
+    return self_comments, organic_comments, has_page_comment
 
 
-def fetch_comments_for_post(post_id, token, api_page_id):
+def feed_since(publish_date):
     """
-    Fetch comments for a post and count self-comments vs organic.
-    Returns: (self_comments, organic_comments, has_page_comment)
+    Unix timestamp a day before a YYYY-MM-DD publish date, so a publish_time
+    stored in local time still falls inside the feed walk.
+    Returns None when the date is missing or malformed.
     """
-    full_post_id = f"{api_page_id}_{post_id}"
-    url = f"https://graph.facebook.com/v21.0/{full_post_id}/comments"
+    try:
+        day = datetime.strptime(publish_date, "%Y-%m-%d") - timedelta(days=1)
+    except (TypeError, ValueError):
+        return None
+    return int(day.timestamp())
+
+
+def fetch_page_comment_counts(token, api_page_id, wanted, since=None):
+    """
+    Count comments for many posts at once by walking the page feed, where each
+    entry carries its comment total and first 100 commenters. Stops as soon as
+    every post in `wanted` (database post ids) has been seen, once the feed is
+    older than the `since` unix timestamp, or after MAX_FEED_PAGES pages.
+    Returns: {post_id: (self_comments, organic_comments, has_page_comment)}
+    """
+    url = f"https://graph.facebook.com/v21.0/{api_page_id}/feed"
     params = {
-        "fields": "from",
-        "limit": 100,
+        "fields": f"id,created_time,{COMMENTS_FIELD}",
+        "limit": 25,
         "access_token": token
     }
+    if since is not None:
+        params["since"] = since
 
-    self_comments = 0
-    organic_comments = 0
-
+    found = {}
+    pages = 0
     try:
-        while url:
-            response = requests.get(url, params=params)
-            data = response.json()
-
-            if "error" in data:
-                return 0, 0, False
-
-            comments = data.get("data", [])
-            for comment in comments:
-                commenter = comment.get("from", {})
-                commenter_id = commenter.get("id", "")
-
-                if commenter_id == api_page_id:
-                    self_comments += 1
-                else:
-                    organic_comments += 1
-
-            paging = data.get("paging", {})
-            url = paging.get("next")
+        while url and len(found) < len(wanted) and pages < MAX_FEED_PAGES:
+            response = SESSION.get(url, params=params, timeout=TIMEOUT)
+            if response.status_code != 200:
+                break
+            data = json_loads(response.content)
+            throttle(response)
+            pages += 1
+
+            for entry in data.get("data", []):
+                # The feed is newest first - nothing wanted is older than since
+                created = entry.get("created_time")
+                if since is not None and created and \
+                        datetime.strptime(created, "%Y-%m-%dT%H:%M:%S%z").timestamp() < since:
+                    url = None
+                    break
+                post_id = entry["id"]
+                if post_id not in wanted:
+                    # Posts imported from CSV are stored without the page prefix
+                    post_id = post_id.split("_", 1)[-1]
+                if post_id in wanted:
+                    counts = count_self_comments(entry.get("comments", {}), api_page_id)
+                    # A failed count is left for the per-post fallback
+                    if counts is not None:
+                        found[post_id] = counts
+
+            else:
+                url = data.get("paging", {}).get("next")
             params = {}
+    except Exception:
+        # Whatever the feed did not cover falls back to per-post requests
+        pass
 
-    except Exception as e:
-        return 0, 0, False
+    return found
 
-    has_page_comment = self_comments > 0
-    return self_comments, organic_comments, has_page_comment
 
+def fetch_comments_for_posts(post_ids, token, api_page_id):
+    """
+    Fetch comments for up to 50 posts in one Graph API batch request and count
+    self-comments vs organic. Each post is its own sub-request, so a deleted
+    post fails alone instead of failing the whole batch.
+    Returns: {post_id: (self_comments, organic_comments, has_page_comment)}
+    """
+    batch = [{"method": "GET", "relative_url": f"v21.0/{api_page_id}_{post_id}?fields={COMMENTS_FIELD}"}
+             for post_id in post_ids]
 
-def process_post(post_data, counter, total):
-    """Process a single post - used by thread pool."""
-    post_id, db_page_id, comments_count = post_data
+    counts = {}
+    try:
+        response = SESSION.post("https://graph.facebook.com/",
+                                data={"access_token": token, "batch": json.dumps(batch)},
+                                timeout=TIMEOUT)
+        if response.status_code != 200:
+            return counts
+        data = json_loads(response.content)
+        throttle(response)
+
+        for post_id, item in zip(post_ids, data):
+            if not item or item.get("code") != 200:
+                continue
+            body = json_loads(item["body"])
+            post_counts = count_self_comments(body.get("comments", {}), api_page_id)
+            # Posts whose comments could not be fully counted are not updated
+            if post_counts is not None:
+                counts[post_id] = post_counts
+
+    except Exception:
+        pass
+
+    return counts
+
+
+def process_batch(lookup, post_ids, counter, total):
+    """Process up to 50 posts of one page - used by thread pool.
+    lookup is the page's (token, api_page_id) from PAGE_LOOKUP."""
+    token, api_page_id = lookup
+    counts = fetch_comments_for_posts(post_ids, token, api_page_id)
 
-    token, api_page_id = get_token_for_page(db_page_id)
-    if not token:
-        return None
+    results = []
+    for post_id, (self_comments, organic_comments, has_page_comment) in counts.items():
+        current = next(counter)
+        if self_comments + organic_comments > 0:
+            print(f"[{current}/{total}] {post_id[:25]}... Self:{self_comments} Organic:{organic_comments}")
 
-    self_comments, organic_comments, has_page_comment = fetch_comments_for_post(
-        post_id, token, api_page_id
-    )
-
-    current = counter.increment()
-    if self_comments + organic_comments > 0:
-        print(f"[{current}/{total}] {post_id[:25]}... Self:{self_comments} Organic:{organic_comments}")
-
-    return {
-        'post_id': post_id,
-        'self_comments': self_comments,
-        'organic_comments': organic_comments,
-        'has_page_comment': has_page_comment
-    }
+        results.append({
+            'post_id': post_id,
+            'self_comments': self_comments,
+            'organic_comments': organic_comments,
+            'has_page_comment': has_page_comment
+        })
+    return results
 
 
 def main():
@@ -177,11 +280,21 @@ def main():
     print(f"Mapped {len(PAGE_ID_MAP)} pages")
 
     conn = sqlite3.connect(DATABASE_PATH)
+    conn.execute("PRAGMA journal_mode = WAL")
+    conn.execute("PRAGMA synchronous = NORMAL")
+    conn.execute("PRAGMA temp_store = MEMORY")
+    # Partial covering index, so the driving query below is an index range
+    # scan already in comments_count order - no table scan, no sort
+    conn.execute("DROP INDEX IF EXISTS idx_posts_comments_count")
+    conn.execute("""
+        CREATE INDEX IF NOT EXISTS idx_posts_comments_count_published
+        ON posts(comments_count DESC, post_id, page_id, publish_time) WHERE comments_count > 0
+    """)
     cursor = conn.cursor()
 
     # Get posts with comments
     query = """
-        SELECT post_id, page_id, comments_count
+        SELECT post_id, page_id, comments_count, substr(publish_time, 1, 10)
         FROM posts
         WHERE comments_count > 0
         ORDER BY comments_count DESC
@@ -195,35 +308,71 @@ def main():
 
     print(f"Found {total} posts with comments to process\n")
 
-    counter = Counter()
-    results = []
+    # Resolve each post's (token, api_page_id) once, dropping posts of
+    # unmapped pages before any work is scheduled
+    by_page = {}
+    # Oldest publish date wanted per page; a post without one leaves it None
+    oldest = {}
+    for post_id, db_page_id, comments_count, publish_date in posts:
+        lookup = PAGE_LOOKUP.get(db_page_id)
+        if lookup:
+            by_page.setdefault(lookup, []).append(post_id)
+            if lookup not in oldest:
+                oldest[lookup] = publish_date
+            elif oldest[lookup] and (not publish_date or publish_date < oldest[lookup]):
+                oldest[lookup] = publish_date
+
+    # Walk each page's feed once; it covers most posts without a request each
+    feed_counts = {}
+    with ThreadPoolExecutor(max_workers=args.workers) as executor:
+        futures = [executor.submit(fetch_page_comment_counts, token, api_page_id, set(post_ids),
+                                   feed_since(oldest[(token, api_page_id)]))
+                   for (token, api_page_id), post_ids in by_page.items()]
+        for future in as_completed(futures):
+            feed_counts.update(future.result())
+
+    print(f"Counted {len(feed_counts)} posts from page feeds")
 
-    # Process posts in parallel
+    results = [{
+        'post_id': post_id,
+        'self_comments': self_comments,
+        'organic_comments': organic_comments,
+        'has_page_comment': has_page_comment
+    } for post_id, (self_comments, organic_comments, has_page_comment) in feed_counts.items()
+        if self_comments + organic_comments > 0]
+
+    # Posts the feed did not reach are fetched 50 per batch request, per page
+    batches = []
+    for lookup, post_ids in by_page.items():
+        left = [post_id for post_id in post_ids if post_id not in feed_counts]
+        batches.extend((lookup, left[i:i + BATCH_SIZE]) for i in range(0, len(left), BATCH_SIZE))
+    remaining = sum(len(post_ids) for _, post_ids in batches)
+    print(f"Fetching {remaining} remaining posts in {len(batches)} batch requests\n")
+
+    # next() on itertools.count is atomic under the GIL, so threads share it without a lock
+    counter = itertools.count(1)
+
+    # Process batches in parallel
     with ThreadPoolExecutor(max_workers=args.workers) as executor:
-        futures = {executor.submit(process_post, post, counter, total): post for post in posts}
+        futures = [executor.submit(process_batch, lookup, post_ids, counter, remaining)
+                   for lookup, post_ids in batches]
 
         for future in as_completed(futures):
-            result = future.result()
-            if result and result['self_comments'] + result['organic_comments'] > 0:
-                results.append(result)
+            results.extend(result for result in future.result()
+                           if result['self_comments'] + result['organic_comments'] > 0)
 
     # Update database with results
     print(f"\nUpdating database with {len(results)} results...")
 
-    total_self = 0
-    total_organic = 0
-
-    for result in results:
-        cursor.execute("""
-            UPDATE posts
-            SET page_comments = ?, has_page_comment = ?
-            WHERE post_id = ?
-        """, (result['self_comments'], 1 if result['has_page_comment'] else 0, result['post_id']))
-
-        total_self += result['self_comments']
-        total_organic += result['organic_comments']
+    # One executemany in a single transaction
+    with conn:
+        cursor.executemany(_UPDATE_COMMENTS_SQL, [
+            (result['self_comments'], 1 if result['has_page_comment'] else 0, result['post_id'])
+            for result in results
+        ])
 
-    conn.commit()
+    total_self = sum(result['self_comments'] for result in results)
+    total_organic = sum(result['organic_comments'] for result in results)
 
     print()
     print("=" * 60)
@@ -8,13 +8,18 @@ Usage:
     python fetch_missing_posts.py --silent  # Silent mode (no notifications)
 """
 
-import json
 import sqlite3
-import requests
-import time
 import sys
 from datetime import datetime, timedelta
+from functools import lru_cache
 from concurrent.futures import ThreadPoolExecutor, as_completed
+from facebook_api import TIMEOUT, make_session, throttle
+
+# orjson (C decoder) is optional - fall back to the stdlib json module
+try:
+    from orjson import loads as json_loads
+except ImportError:
+    from json import loads as json_loads
 
 # Import database function for duplicate prevention
 try:
@@ -44,9 +49,49 @@ def normalize_post_id(post_id):
 
 DATABASE_PATH = "data/juanbabes_analytics.db"
 
-# Load tokens
-with open("page_tokens.json", "r") as f:
-    PAGE_TOKENS = json.load(f)
+_INSERT_POST_SQL = """
+    INSERT OR IGNORE INTO posts
+    (post_id, page_id, title, permalink, post_type, publish_time,
+     reactions_total, comments_count, shares_count,
+     pes, total_engagement, fetched_at)
+    VALUES
+"""
+_INSERT_POST_VALUES = "(?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)"
+# Rows per multi-row INSERT; 80 x 12 parameters stays under SQLite's
+# default limit of 999 bound variables on older builds
+INSERT_ROWS_PER_STATEMENT = 80
+
+# Only run for posts that have NO views data (API posts, not CSV) - main()
+# picks those from get_existing_post_ids
+_UPDATE_ENGAGEMENT_SQL = """
+    UPDATE posts
+    SET reactions_total = ?,
+        comments_count = ?,
+        shares_count = ?,
+        pes = ?,
+        total_engagement = ?,
+        fetched_at = ?
+    WHERE post_id = ?
+"""
+
+SESSION = make_session()
+
+
+@lru_cache(maxsize=1)
+def load_page_tokens():
+    """Read page_tokens.json on first use, so importing this module stays cheap."""
+    with open("page_tokens.json", "rb") as f:
+        return json_loads(f.read())
+
+
+@lru_cache(maxsize=1)
+def load_valid_pages():
+    """Pages that can be queried, as (label, page_id, page_name, token)."""
+    return [
+        (label, data["page_id"], data.get("page_name", label), data["page_access_token"])
+        for label, data in load_page_tokens().items()
+        if data.get("page_access_token") and data.get("page_id")
+    ]
 
 
 def get_db_page_ids():
@@ -59,14 +104,21 @@ def get_db_page_ids():
     return page_ids
 
 
-def get_existing_post_ids():
-    """Get all post IDs already in database."""
-    conn = sqlite3.connect(DATABASE_PATH)
-    cursor = conn.cursor()
-    cursor.execute("SELECT post_id FROM posts")
-    ids = set(row[0] for row in cursor.fetchall())
-    conn.close()
-    return ids
+def get_existing_post_ids(conn, post_ids):
+    """Return which of post_ids are already in database, as {post_id: has_views}.
+
+    has_views is True for posts with CSV views data, which API engagement
+    must not overwrite. The fetched ids go into a temp table and are joined
+    against the posts primary key, instead of loading every stored post_id
+    into Python.
+    """
+    conn.execute("CREATE TEMP TABLE IF NOT EXISTS fetched_ids (id TEXT PRIMARY KEY)")
+    conn.execute("DELETE FROM fetched_ids")
+    conn.executemany("INSERT OR IGNORE INTO fetched_ids VALUES (?)", [(i,) for i in post_ids])
+    return {post_id: bool(has_views) for post_id, has_views in conn.execute("""
+        SELECT f.id, COALESCE(p.views_count, 0) != 0
+        FROM fetched_ids f JOIN posts p ON p.post_id = f.id
+    """)}
 
 
 def fetch_posts_from_api(token, page_id, page_name, days_back=14):
@@ -85,8 +137,8 @@ def fetch_posts_from_api(token, page_id, page_name, days_back=14):
 
     while True:
         try:
-            resp = requests.get(url, params=params)
-            data = resp.json()
+            resp = SESSION.get(url, params=params, timeout=TIMEOUT)
+            data = json_loads(resp.content)
 
             if "error" in data:
                 error_msg = data['error'].get('message', 'Unknown')
@@ -109,7 +161,8 @@ def fetch_posts_from_api(token, page_id, page_name, days_back=14):
             else:
                 break
 
-            time.sleep(0.1)
+            # Back off only when the usage headers say we are near the limit
+            throttle(resp)
         except Exception as e:
             print(f"  [{page_name}] Error: {e}")
             break
@@ -127,60 +180,26 @@ def extract_post_details(post):
     return reactions, comments, shares, post_type
 
 
-def get_post_details(token, post_id):
-    """DEPRECATED - Returns zeros. Use extract_post_details instead."""
-    # This function no longer works due to API permission issues
-    # Kept for backwards compatibility but returns zeros
-    return 0, 0, 0, "Videos"
-
-
-def _old_get_post_details(token, post_id):
-    """Old implementation - kept for reference only."""
-    try:
-        url = f"https://graph.facebook.com/v21.0/{post_id}"
-        params = {
-            "access_token": token,
-            "fields": "reactions.summary(total_count),comments.summary(total_count),shares"
-        }
-        resp = requests.get(url, params=params)
-        data = resp.json()
-
-        reactions = data.get("reactions", {}).get("summary", {}).get("total_count", 0)
-        comments = data.get("comments", {}).get("summary", {}).get("total_count", 0)
-        shares = data.get("shares", {}).get("count", 0)
-
-        attachments = data.get("attachments", {}).get("data", [])
-        if attachments:
-            media_type = attachments[0].get("media_type", "").lower()
-            if media_type == "video":
-                post_type = "Videos"
-            elif media_type == "photo":
-                post_type = "Photos"
-            else:
-                post_type = "Text"
-        else:
-            post_type = "Text"
-
-        return reactions, comments, shares, post_type
-    except:
-        return 0, 0, 0, "Text"
-
+def save_posts(cursor, rows):
+    """Save NEW posts (save_post_row tuples) to database.
+    Writes up to INSERT_ROWS_PER_STATEMENT rows per multi-row INSERT.
+    Returns the set of post_ids actually inserted (ignored duplicates excluded)."""
+    inserted = set()
+    for i in range(0, len(rows), INSERT_ROWS_PER_STATEMENT):
+        chunk = rows[i:i + INSERT_ROWS_PER_STATEMENT]
+        values = ", ".join([_INSERT_POST_VALUES] * len(chunk))
+        cursor.execute(f"{_INSERT_POST_SQL} {values} RETURNING post_id",
+                       [value for row in chunk for value in row])
+        inserted.update(row[0] for row in cursor.fetchall())
+    return inserted
 
-def save_post(conn, page_id, post_id, post_data, reactions, comments, shares, post_type):
-    """Save a NEW post to database."""
-    cursor = conn.cursor()
-    now = datetime.now().isoformat()
 
+def save_post_row(page_id, post_id, post_data, reactions, comments, shares, post_type, now):
+    """Build the INSERT parameters for a NEW post."""
     total_engagement = reactions + comments + shares
     pes = (reactions * 1.0) + (comments * 2.0) + (shares * 3.0)
 
-    cursor.execute("""
-        INSERT OR IGNORE INTO posts
-        (post_id, page_id, title, permalink, post_type, publish_time,
-         reactions_total, comments_count, shares_count,
-         pes, total_engagement, fetched_at)
-        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-    """, (
+    return (
         post_id,
         page_id,
         (post_data.get("message", "") or "")[:200],
@@ -193,31 +212,21 @@ def save_post(conn, page_id, post_id, post_data, reactions, comments, shares, po
         pes,
         total_engagement,
         now
-    ))
-    return cursor.rowcount > 0
+    )
 
 
-def update_post_engagement(conn, post_id, reactions, comments, shares):
-    """Update engagement data for existing API posts (no views/reach)."""
-    cursor = conn.cursor()
-    now = datetime.now().isoformat()
+def update_post_engagement(cursor, rows):
+    """Update engagement data for existing API posts (no views/reach).
+    Returns rows updated."""
+    cursor.executemany(_UPDATE_ENGAGEMENT_SQL, rows)
+    return cursor.rowcount
 
+
+def engagement_row(post_id, reactions, comments, shares, now):
+    """Build the UPDATE parameters for an existing post."""
     total_engagement = reactions + comments + shares
     pes = (reactions * 1.0) + (comments * 2.0) + (shares * 3.0)
-
-    # Only update posts that have NO views data (API posts, not CSV)
-    cursor.execute("""
-        UPDATE posts
-        SET reactions_total = ?,
-            comments_count = ?,
-            shares_count = ?,
-            pes = ?,
-            total_engagement = ?,
-            fetched_at = ?
-        WHERE post_id = ?
-        AND (views_count IS NULL OR views_count = 0)
-    """, (reactions, comments, shares, pes, total_engagement, now, post_id))
-    return cursor.rowcount > 0
+    return (reactions, comments, shares, pes, total_engagement, now, post_id)
 
 
 def main():
@@ -225,79 +234,87 @@ def main():
     print("Fetching Missing Posts from FB API")
     print("=" * 60)
 
-    # Get existing post IDs
-    existing_ids = get_existing_post_ids()
-    print(f"Existing posts in database: {len(existing_ids)}")
-
     # Get valid page IDs from database
     db_page_ids = get_db_page_ids()
     print(f"Pages in database: {len(db_page_ids)}")
 
     conn = sqlite3.connect(DATABASE_PATH)
-    conn.row_factory = sqlite3.Row
+    conn.execute("PRAGMA journal_mode = WAL")
+    conn.execute("PRAGMA synchronous = NORMAL")
+    conn.execute("PRAGMA temp_store = MEMORY")
+    conn.execute("PRAGMA cache_size = -16384")
+    cursor = conn.cursor()
+    now = datetime.now().isoformat()
     total_new = 0
 
-    for label, data in PAGE_TOKENS.items():
-        page_id = data.get("page_id")
-        page_name = data.get("page_name", label)
-        token = data.get("page_access_token")
+    # Fetch every page's listing in parallel; results are written here on the
+    # main thread once they are all in
+    print("\nFetching recent posts for all pages...")
+    with ThreadPoolExecutor(max_workers=5) as executor:
+        futures = {
+            executor.submit(fetch_posts_from_api, token, page_id, page_name, days_back=7):
+                (page_id, page_name)
+            for label, page_id, page_name, token in load_valid_pages()
+        }
+        page_results = [(futures[future], future.result()) for future in as_completed(futures)]
 
-        if not token or not page_id:
-            continue
+    # Which of the fetched posts are already stored
+    existing_ids = get_existing_post_ids(conn, [normalize_post_id(p["id"])
+                                                for _, posts in page_results for p in posts])
+    print(f"Fetched posts already in database: {len(existing_ids)}")
 
+    for (page_id, page_name), posts in page_results:
         # Use page_id directly (must match database)
         db_page_id = page_id
 
-        print(f"\n[{page_name}] Fetching recent posts...")
-
-        posts = fetch_posts_from_api(token, page_id, page_name, days_back=7)
-        print(f"  Found {len(posts)} posts from API")
+        print(f"\n[{page_name}] Found {len(posts)} posts from API")
 
         # Filter to only new posts NOT in database (normalize IDs for comparison)
         new_posts = [p for p in posts if normalize_post_id(p["id"]) not in existing_ids]
         print(f"  New posts not in database: {len(new_posts)}")
 
-        # Save new posts (only skip if post already exists in DB)
-        page_new = 0
-        for post in new_posts:
-            full_post_id = post["id"]
-            normalized_id = normalize_post_id(full_post_id)
+        # Save new posts in multi-row INSERTs (only skip if post already exists in DB,
+        # e.g. added from another page's listing earlier in this run)
+        new_by_id = {normalize_post_id(p["id"]): p for p in new_posts}
+        inserted = save_posts(cursor, [
+            save_post_row(db_page_id, normalized_id, post, *extract_post_details(post), now)
+            for normalized_id, post in new_by_id.items()
+        ])
+
+        # Log and alert only for rows the INSERT OR IGNORE actually added
+        for normalized_id, post in new_by_id.items():
+            if normalized_id not in inserted:
+                continue
             created_time = post.get("created_time", "")
             post_date = created_time[:10] if created_time else ""
-
-            reactions, comments, shares, post_type = extract_post_details(post)
-
-            if save_post(conn, db_page_id, normalized_id, post, reactions, comments, shares, post_type):
-                page_new += 1
-                print(f"  + Added ({post_date}): {normalized_id[:25]}...")
-
-                # Send Telegram notification for new post
-                if TELEGRAM_ENABLED:
-                    try:
-                        send_new_post_alert(
-                            page_name=page_name,
-                            post_type=post_type,
-                            title=post.get("message", ""),
-                            permalink=post.get("permalink_url", ""),
-                            publish_time=created_time
-                        )
-                        print(f"  -> Telegram alert sent!")
-                    except Exception as e:
-                        print(f"  -> Telegram error: {e}")
-
-        # Update existing API posts (refresh engagement data)
-        existing_posts = [p for p in posts if normalize_post_id(p["id"]) in existing_ids]
-        page_updated = 0
-        for post in existing_posts:
-            normalized_id = normalize_post_id(post["id"])
-            reactions, comments, shares, post_type = extract_post_details(post)
-            if update_post_engagement(conn, normalized_id, reactions, comments, shares):
-                page_updated += 1
+            post_type = extract_post_details(post)[3]
+            print(f"  + Added ({post_date}): {normalized_id[:25]}...")
+
+            # Send Telegram notification for new post
+            if TELEGRAM_ENABLED:
+                try:
+                    send_new_post_alert(
+                        page_name=page_name,
+                        post_type=post_type,
+                        title=post.get("message", ""),
+                        permalink=post.get("permalink_url", ""),
+                        publish_time=created_time
+                    )
+                    print(f"  -> Telegram alert sent!")
+                except Exception as e:
+                    print(f"  -> Telegram error: {e}")
+
+        # Update existing API posts (refresh engagement data); CSV posts keep theirs
+        existing_posts = [p for p in posts if existing_ids.get(normalize_post_id(p["id"])) is False]
+        page_updated = update_post_engagement(cursor, [
+            engagement_row(normalize_post_id(post["id"]), *extract_post_details(post)[:3], now)
+            for post in existing_posts
+        ])
 
         if page_updated > 0:
             print(f"  ~ Updated {page_updated} existing posts")
 
-        total_new += page_new
+        total_new += len(inserted)
 
     conn.commit()
     conn.close()
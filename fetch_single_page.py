@@ -1,27 +1,40 @@
 #!/usr/bin/env python3
 """Fetch data from a single Facebook page - simpler, faster approach."""
 
-import json
 import sqlite3
-import requests
-import time
 from datetime import datetime
+from functools import lru_cache
+from facebook_api import TIMEOUT, make_session, throttle
 
-# Load page tokens
-with open("page_tokens.json", "r") as f:
-    PAGE_TOKENS = json.load(f)
+# orjson (C decoder) is optional - fall back to the stdlib json module
+try:
+    from orjson import loads as json_loads
+except ImportError:
+    from json import loads as json_loads
 
 DATABASE_PATH = "data/juanbabes_analytics.db"
 START_DATE = "2025-10-01"  # Start from October 2025
+IDS_PER_REQUEST = 50  # Graph API ?ids= limit
+
+SESSION = make_session()
+
+
+@lru_cache(maxsize=1)
+def load_page_tokens():
+    """Read page_tokens.json on first use, so importing this module stays cheap."""
+    with open("page_tokens.json", "rb") as f:
+        return json_loads(f.read())
 
 
 def get_conn():
-    return sqlite3.connect(DATABASE_PATH)
+    conn = sqlite3.connect(DATABASE_PATH)
+    conn.execute("PRAGMA journal_mode = WAL")
+    conn.execute("PRAGMA synchronous = NORMAL")
+    return conn
 
 
-def save_page(page_data):
-    """Save page info to database."""
-    conn = get_conn()
+def save_page(conn, page_data):
+    """Save page info to database (caller commits)."""
     cursor = conn.cursor()
     now = datetime.now().isoformat()
 
@@ -38,13 +51,10 @@ def save_page(page_data):
         now,
         now
     ))
-    conn.commit()
-    conn.close()
 
 
-def save_post(page_id, post_data):
-    """Save post to database."""
-    conn = get_conn()
+def save_post(conn, page_id, post_data):
+    """Save post to database (caller commits)."""
     cursor = conn.cursor()
     now = datetime.now().isoformat()
 
@@ -70,8 +80,50 @@ def save_post(page_id, post_data):
         post_data.get("engagement", 0),
         now
     ))
-    conn.commit()
-    conn.close()
+
+
+def _fetch_ids(token, post_ids):
+    """One ?ids= request; returns {post_id: (reactions, comments)}, or None on failure."""
+    try:
+        resp = SESSION.get("https://graph.facebook.com/v21.0/", params={
+            "access_token": token,
+            "ids": ",".join(post_ids),
+            "fields": "reactions.summary(total_count),comments.summary(total_count)"
+        }, timeout=TIMEOUT)
+        result = json_loads(resp.content)
+    except Exception as e:
+        print(f"  Detail fetch error: {e}")
+        return None
+
+    if "error" in result:
+        print(f"  Detail fetch error: {result['error'].get('message', 'Unknown')}")
+        return None
+    # Back off only when the usage headers say we are near the limit
+    throttle(resp)
+
+    return {post_id: (
+        detail.get("reactions", {}).get("summary", {}).get("total_count", 0),
+        detail.get("comments", {}).get("summary", {}).get("total_count", 0)
+    ) for post_id, detail in result.items()}
+
+
+def get_post_details_batch(token, post_ids):
+    """Fetch reactions/comments counts with one ?ids= request per 50 posts.
+
+    A single bad id fails the whole request, so a failed chunk is retried one
+    id at a time. Returns: {post_id: (reactions, comments)}; posts that could
+    not be fetched are left out and must not be saved.
+    """
+    details = {}
+    for i in range(0, len(post_ids), IDS_PER_REQUEST):
+        chunk = post_ids[i:i + IDS_PER_REQUEST]
+        chunk_details = _fetch_ids(token, chunk)
+        if chunk_details is None and len(chunk) > 1:
+            chunk_details = {}
+            for post_id in chunk:
+                chunk_details.update(_fetch_ids(token, [post_id]) or {})
+        details.update(chunk_details or {})
+    return details
 
 
 def classify_post(message):
@@ -88,11 +140,12 @@ def classify_post(message):
 
 def fetch_page(page_label):
     """Fetch all data for a single page."""
-    if page_label not in PAGE_TOKENS:
-        print(f"Page '{page_label}' not found. Available: {list(PAGE_TOKENS.keys())}")
+    page_tokens = load_page_tokens()
+    if page_label not in page_tokens:
+        print(f"Page '{page_label}' not found. Available: {list(page_tokens.keys())}")
         return
 
-    data = PAGE_TOKENS[page_label]
+    data = page_tokens[page_label]
     if "error" in data:
         print(f"Error for {page_label}: {data['error']}")
         return
@@ -108,8 +161,12 @@ def fetch_page(page_label):
     print(f"Starting from: {START_DATE}")
     print(f"{'='*60}")
 
+    # One connection for the whole page
+    conn = get_conn()
+
     # Save page info
-    save_page(data)
+    save_page(conn, data)
+    conn.commit()
 
     # Fetch posts
     start_timestamp = int(datetime.strptime(START_DATE, "%Y-%m-%d").timestamp())
@@ -128,8 +185,8 @@ def fetch_page(page_label):
     print("\nFetching posts...")
     while True:
         try:
-            resp = requests.get(url, params=params, timeout=30)
-            result = resp.json()
+            resp = SESSION.get(url, params=params, timeout=TIMEOUT)
+            result = json_loads(resp.content)
 
             if "error" in result:
                 print(f"API Error: {result['error'].get('message', 'Unknown')}")
@@ -150,7 +207,7 @@ def fetch_page(page_label):
                 url = next_url
                 params = {}
                 page_num += 1
-                time.sleep(0.5)
+                throttle(resp)
             else:
                 break
 
@@ -160,27 +217,23 @@ def fetch_page(page_label):
 
     print(f"\nTotal posts fetched: {len(all_posts)}")
 
+    # Get reactions and comments counts, 50 posts per request
+    print("\nFetching reactions and comments...")
+    details = get_post_details_batch(token, [post["id"] for post in all_posts])
+
     # Process and save each post
     print("\nProcessing posts...")
     saved = 0
+    skipped = 0
     for i, post in enumerate(all_posts):
         post_id = post["id"]
         shares = post.get("shares", {}).get("count", 0)
         message = post.get("message", "")
-
-        # Get reactions and comments count
-        try:
-            detail_url = f"https://graph.facebook.com/v21.0/{post_id}"
-            detail_resp = requests.get(detail_url, params={
-                "access_token": token,
-                "fields": "reactions.summary(total_count),comments.summary(total_count)"
-            }, timeout=10)
-            detail = detail_resp.json()
-            reactions = detail.get("reactions", {}).get("summary", {}).get("total_count", 0)
-            comments = detail.get("comments", {}).get("summary", {}).get("total_count", 0)
-        except:
-            reactions = 0
-            comments = 0
+        # Without details the stored row is kept rather than zeroed
+        if post_id not in details:
+            skipped += 1
+            continue
+        reactions, comments = details[post_id]
 
         # Calculate PES
         pes = (reactions * 1.0) + (comments * 2.0) + (shares * 3.0)
@@ -199,30 +252,34 @@ def fetch_page(page_label):
             "engagement": engagement
         }
 
-        save_post(page_id, post_data)
+        save_post(conn, page_id, post_data)
         saved += 1
 
         if (i + 1) % 10 == 0:
             print(f"  Processed {i + 1}/{len(all_posts)} posts...")
 
-        time.sleep(0.2)  # Rate limiting
+    # All posts in one transaction
+    conn.commit()
+    conn.close()
 
     print(f"\nSaved {saved} posts to database")
+    if skipped:
+        print(f"Skipped {skipped} posts whose details could not be fetched")
     return saved
 
 
 def fetch_all_pages():
     """Fetch all pages one by one."""
     total = 0
-    for label in PAGE_TOKENS.keys():
-        if "error" not in PAGE_TOKENS[label]:
+    page_tokens = load_page_tokens()
+    for label in page_tokens.keys():
+        if "error" not in page_tokens[label]:
             count = fetch_page(label)
             if count:
                 total += count
-            time.sleep(1)
 
     print(f"\n{'='*60}")
-    print(f"TOTAL: {total} posts from {len(PAGE_TOKENS)} pages")
+    print(f"TOTAL: {total} posts from {len(page_tokens)} pages")
     print(f"{'='*60}")
 
 
@@ -236,7 +293,7 @@ if __name__ == "__main__":
     else:
         # Show available pages
         print("Available pages:")
-        for label, data in PAGE_TOKENS.items():
+        for label, data in load_page_tokens().items():
             status = "OK" if "page_id" in data else f"Error: {data.get('error', 'Unknown')}"
             print(f"  - {label}: {status}")
         print("\nUsage: python fetch_single_page.py <page_label>")
@@ -14,17 +14,48 @@ Usage:
 
 import os
 import sys
-import json
 import sqlite3
 import argparse
-import requests
 from datetime import datetime, timedelta, timezone
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
+from facebook_api import CACHE_PATH, CACHE_TTL, TIMEOUT, make_session, throttle
+
+# orjson (C decoder) is optional - fall back to the stdlib json module
+try:
+    from orjson import loads as json_loads
+except ImportError:
+    from json import loads as json_loads
+
+try:
+    import requests_cache
+except ImportError:
+    requests_cache = None
 
 # Facebook Graph API settings
 GRAPH_API_VERSION = "v18.0"
 GRAPH_API_BASE = f"https://graph.facebook.com/{GRAPH_API_VERSION}"
 
+
+def has_no_access_token(response) -> bool:
+    """requests-cache filter: never store a body that embeds an access token.
+
+    Graph API paging URLs carry the token, so listing pages with a next or
+    previous link are always fetched live.
+    """
+    return b"access_token=" not in response.content
+
+
+# With FB_API_CACHE_TTL set and requests-cache installed, token-free responses
+# are stored but revalidated on every request (If-None-Match/If-Modified-Since),
+# so an unchanged response comes back as a 304 and the stored body is reused.
+if CACHE_TTL and requests_cache:
+    SESSION = make_session(requests_cache.CachedSession(
+        CACHE_PATH, backend="sqlite", use_cache_dir=True,
+        expire_after=requests_cache.EXPIRE_IMMEDIATELY, filter_fn=has_no_access_token))
+else:
+    SESSION = make_session()
+
 # Project configurations
 PROJECTS = {
     "juanstudio": {
@@ -50,14 +81,106 @@ def load_tokens(project_dir: str) -> dict:
     tokens_path = os.path.join(project_dir, "page_tokens.json")
     if not os.path.exists(tokens_path):
         return {}
-    with open(tokens_path, 'r') as f:
-        return json.load(f)
+    with open(tokens_path, 'rb') as f:
+        return json_loads(f.read())
+
+
+# Extended fields to get full engagement data
+POST_FIELDS = ",".join([
+    "id", "message", "created_time", "permalink_url",
+    "shares", "reactions.summary(true)", "comments.summary(true)",
+    "attachments{type,media_type}"
+])
+
+# Pages are independent and network-bound, so they are fetched in parallel
+MAX_WORKERS = 8
+
+
+def fetch_page_posts_for_month(page_name: str, page_id: str, token: str,
+                               month_start: datetime, month_end: datetime) -> list:
+    """Fetch one page's posts for the month, following pagination."""
+    month_str = month_start.strftime("%Y-%m")
+
+    url = f"{GRAPH_API_BASE}/{page_id}/posts"
+    params = {
+        "access_token": token,
+        "fields": POST_FIELDS,
+        "since": int(month_start.timestamp()),
+        "until": int(month_end.timestamp()),
+        "limit": 100
+    }
+
+    page_posts = []
+
+    while url:
+        try:
+            response = SESSION.get(url, params=params, timeout=TIMEOUT)
+            data = json_loads(response.content)
+
+            if "error" in data:
+                print(f"      {page_name}: API error: {data['error'].get('message', 'Unknown')}")
+                break
+
+            posts = data.get("data", [])
+            for post in posts:
+                created = post.get("created_time", "")[:7]  # YYYY-MM
+                if created == month_str:
+                    # Extract post_id (API returns "pageid_postid" format)
+                    full_id = post.get("id", "")
+                    post_id = full_id.split("_")[-1] if "_" in full_id else full_id
+
+                    # Get metrics
+                    reactions = post.get("reactions", {}).get("summary", {}).get("total_count", 0)
+                    comments = post.get("comments", {}).get("summary", {}).get("total_count", 0)
+                    shares = post.get("shares", {}).get("count", 0)
+
+                    # Determine post type from attachments
+                    attachments = post.get("attachments", {}).get("data", [])
+                    post_type = "Text"
+                    if attachments:
+                        media_type = attachments[0].get("media_type", "")
+                        attach_type = attachments[0].get("type", "")
+                        if media_type == "video" or attach_type == "video_inline":
+                            post_type = "Videos"
+                        elif media_type == "photo" or attach_type == "photo":
+                            post_type = "Photos"
+                        elif attach_type == "native_templates" and "reel" in str(attachments).lower():
+                            post_type = "Reels"
+
+                    page_posts.append({
+                        "post_id": post_id,
+                        "page_id": page_id,
+                        "title": (post.get("message", "") or "")[:200],
+                        "permalink": post.get("permalink_url", ""),
+                        "post_type": post_type,
+                        "publish_time": post.get("created_time", ""),
+                        "reactions_total": reactions,
+                        "comments_count": comments,
+                        "shares_count": shares,
+                        "total_engagement": reactions + comments + shares,
+                        "pes": (reactions * 1.0) + (comments * 2.0) + (shares * 3.0)
+                    })
+
+            # Handle pagination
+            paging = data.get("paging", {})
+            url = paging.get("next")
+            params = {}  # Params included in next URL
+
+            # Back off only when the usage headers say we are near the limit;
+            # a cached body carries stale headers
+            if not getattr(response, "from_cache", False):
+                throttle(response)
+
+        except Exception as e:
+            print(f"      {page_name}: request error: {e}")
+            break
+
+    print(f"      {page_name}: found {len(page_posts)} posts")
+    return page_posts
 
 
 def fetch_all_posts_for_month(tokens: dict, year: int, month: int) -> list:
     """Fetch ALL posts from Facebook API for a specific month."""
-    all_posts = []
-
     # Create UTC timestamps for the month
     month_start = datetime(year, month, 1, tzinfo=timezone.utc)
     if month == 12:
@@ -65,94 +188,22 @@ def fetch_all_posts_for_month(tokens: dict, year: int, month: int) -> list:
     else:
         month_end = datetime(year, month + 1, 1, tzinfo=timezone.utc)
 
-    month_str = f"{year}-{month:02d}"
-
-    # Extended fields to get full engagement data
-    fields = [
-        "id", "message", "created_time", "permalink_url",
-        "shares", "reactions.summary(true)", "comments.summary(true)",
-        "attachments{type,media_type}"
-    ]
-
+    pages = []
     for page_name, page_data in tokens.items():
         page_id = page_data.get("page_id")
         token = page_data.get("page_access_token") or page_data.get("token")
         if not token or not page_id:
             continue
-
         print(f"    Fetching {page_name}...")
+        pages.append((page_name, page_id, token))
 
-        url = f"{GRAPH_API_BASE}/{page_id}/posts"
-        params = {
-            "access_token": token,
-            "fields": ",".join(fields),
-            "since": int(month_start.timestamp()),
-            "until": int(month_end.timestamp()),
-            "limit": 100
-        }
-
-        page_posts = []
-
-        while url:
-            try:
-                response = requests.get(url, params=params, timeout=30)
-                data = response.json()
-
-                if "error" in data:
-                    print(f"      API error: {data['error'].get('message', 'Unknown')}")
-                    break
-
-                posts = data.get("data", [])
-                for post in posts:
-                    created = post.get("created_time", "")[:7]  # YYYY-MM
-                    if created == month_str:
-                        # Extract post_id (API returns "pageid_postid" format)
-                        full_id = post.get("id", "")
-                        post_id = full_id.split("_")[-1] if "_" in full_id else full_id
-
-                        # Get metrics
-                        reactions = post.get("reactions", {}).get("summary", {}).get("total_count", 0)
-                        comments = post.get("comments", {}).get("summary", {}).get("total_count", 0)
-                        shares = post.get("shares", {}).get("count", 0)
-
-                        # Determine post type from attachments
-                        attachments = post.get("attachments", {}).get("data", [])
-                        post_type = "Text"
-                        if attachments:
-                            media_type = attachments[0].get("media_type", "")
-                            attach_type = attachments[0].get("type", "")
-                            if media_type == "video" or attach_type == "video_inline":
-                                post_type = "Videos"
-                            elif media_type == "photo" or attach_type == "photo":
-                                post_type = "Photos"
-                            elif attach_type == "native_templates" and "reel" in str(attachments).lower():
-                                post_type = "Reels"
-
-                        page_posts.append({
-                            "post_id": post_id,
-                            "page_id": page_id,
-                            "title": (post.get("message", "") or "")[:200],
-                            "permalink": post.get("permalink_url", ""),
-                            "post_type": post_type,
-                            "publish_time": post.get("created_time", ""),
-                            "reactions_total": reactions,
-                            "comments_count": comments,
-                            "shares_count": shares,
-                            "total_engagement": reactions + comments + shares,
-                            "pes": (reactions * 1.0) + (comments * 2.0) + (shares * 3.0)
-                        })
-
-                # Handle pagination
-                paging = data.get("paging", {})
-                url = paging.get("next")
-                params = {}  # Params included in next URL
-
-            except Exception as e:
-                print(f"      Request error: {e}")
-                break
-
-        print(f"      Found {len(page_posts)} posts")
-        all_posts.extend(page_posts)
+    # Results are collected in token-file order
+    all_posts = []
+    with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
+        futures = [executor.submit(fetch_page_posts_for_month, *page, month_start, month_end)
+                   for page in pages]
+        for future in futures:
+            all_posts.extend(future.result())
 
     return all_posts
 
@@ -180,73 +231,57 @@ def sync_month_to_db(db_path: str, year: int, month: int, api_posts: list) -> di
 
     # Delete posts that are in DB but NOT in API (for this month only)
     posts_to_delete = db_post_ids - api_post_ids
-    deleted = 0
     if posts_to_delete:
         print(f"    Removing {len(posts_to_delete)} posts not in API...")
-        for post_id in posts_to_delete:
-            cursor.execute("DELETE FROM posts WHERE post_id = ?", (post_id,))
-            deleted += 1
-
-    # Update/insert posts from API
-    updated = 0
-    inserted = 0
-    for post in api_posts:
-        # Check if post exists
-        cursor.execute("SELECT post_id FROM posts WHERE post_id = ?", (post["post_id"],))
-        exists = cursor.fetchone()
-
-        if exists:
-            # Update with latest engagement data
-            cursor.execute("""
-                UPDATE posts SET
-                    title = ?,
-                    permalink = ?,
-                    post_type = ?,
-                    reactions_total = ?,
-                    comments_count = ?,
-                    shares_count = ?,
-                    total_engagement = ?,
-                    pes = ?,
-                    fetched_at = ?
-                WHERE post_id = ?
-            """, (
-                post["title"],
-                post["permalink"],
-                post["post_type"],
-                post["reactions_total"],
-                post["comments_count"],
-                post["shares_count"],
-                post["total_engagement"],
-                post["pes"],
-                datetime.now().isoformat(),
-                post["post_id"]
-            ))
-            updated += 1
-        else:
-            # Insert new post
-            cursor.execute("""
-                INSERT INTO posts
-                (post_id, page_id, title, permalink, post_type, publish_time,
-                 reactions_total, comments_count, shares_count, total_engagement,
-                 pes, fetched_at)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-            """, (
-                post["post_id"],
-                post["page_id"],
-                post["title"],
-                post["permalink"],
-                post["post_type"],
-                post["publish_time"],
-                post["reactions_total"],
-                post["comments_count"],
-                post["shares_count"],
-                post["total_engagement"],
-                post["pes"],
-                datetime.now().isoformat()
-            ))
-            inserted += 1
-
-    conn.commit()
+    deleted = len(posts_to_delete)
+
+    now = datetime.now().isoformat()
+
+    # Deletes and the upsert run in one transaction; new posts are counted
+    # from the table size, so no per-post existence check is needed
+    with conn:
+        cursor.executemany("DELETE FROM posts WHERE post_id = ?",
+                           [(post_id,) for post_id in posts_to_delete])
+
+        cursor.execute("SELECT COUNT(*) FROM posts")
+        count_before = cursor.fetchone()[0]
+
+        # Insert new posts; update existing ones with latest engagement data
+        cursor.executemany("""
+            INSERT INTO posts
+            (post_id, page_id, title, permalink, post_type, publish_time,
+             reactions_total, comments_count, shares_count, total_engagement,
+             pes, fetched_at)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            ON CONFLICT(post_id) DO UPDATE SET
+                title = excluded.title,
+                permalink = excluded.permalink,
+                post_type = excluded.post_type,
+                reactions_total = excluded.reactions_total,
+                comments_count = excluded.comments_count,
+                shares_count = excluded.shares_count,
+                total_engagement = excluded.total_engagement,
+                pes = excluded.pes,
+                fetched_at = excluded.fetched_at
+        """, [(
+            post["post_id"],
+            post["page_id"],
+            post["title"],
+            post["permalink"],
+            post["post_type"],
+            post["publish_time"],
+            post["reactions_total"],
+            post["comments_count"],
+            post["shares_count"],
+            post["total_engagement"],
+            post["pes"],
+            now
+        ) for post in api_posts])
+
+        cursor.execute("SELECT COUNT(*) FROM posts")
+        inserted = cursor.fetchone()[0] - count_before
+        updated = len(api_posts) - inserted
+
     conn.close()
 
     return {